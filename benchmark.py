@@ -0,0 +1,288 @@
+import argparse
+import concurrent.futures
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import profiling
+import simulation
+
+
+
+# --- Constants ---
+
+BENCHMARK_PATH = simulation.STATS_PATH.parent / "benchmark"
+# Engine or mode name -> Config overrides, "agents" and "vectorized" are the plain engines (named as in checkpoints)
+ENGINES = {
+    "agents": {},
+    "neighbor-lists": {"use_neighbor_lists": True},
+    "single-draw": {"single_draw_infection": True},
+    "vectorized": {"use_vectorized_engine": True},
+    "event-calendar": {"use_vectorized_engine": True, "use_event_calendar": True},
+    "mean-field": {"use_vectorized_engine": True, "mean_field_infection": True},
+    "parallel-2": {"use_vectorized_engine": True, "workers": 2}, # phases and peak memory are of the parent process only
+    "parallel-4": {"use_vectorized_engine": True, "workers": 4},
+}
+SIZES = [500, 5_000, 50_000, 500_000]
+REFERENCE_MAX_AGENTS = 50_000 # larger cases of reference engine modes are skipped, a day of them takes minutes
+DAYS = 10
+SEED = 12345
+MEAN_FIELD_SIZES = [5_000, 50_000]
+MEAN_FIELD_DAYS = 200
+MEAN_FIELD_REPLICATES = 5
+FAST_FORWARD_SIZES = [500]
+FAST_FORWARD_DAYS = 150
+FAST_FORWARD_REPLICATES = 6
+FAST_FORWARD_QUIET_DAYS = 30 # stop_after_quiet_days of the fast-forwarded runs
+FAST_FORWARD_EPIDEMIC = {"infected_on_start": 0.05, "infection_probability": 0.02, "min_infected_days": 5, "cure_probability": 0.3} # dies out early
+COMPARTMENTS = simulation.STATS_COLUMNS[1:4]
+
+
+
+# --- Benchmark ---
+
+def world_size(num_agents) -> tuple[int, int]:
+    """Default world grown in area with the population, so every size runs at the density of the default one."""
+    scale = max(1.0, num_agents / simulation.NUM_AGENTS) ** 0.5
+    return round(simulation.WORLD_WIDTH * scale), round(simulation.WORLD_HEIGHT * scale)
+
+
+def run_case(engine, num_agents, days, seed) -> dict:
+    """Times days of one engine and population size, then repeats them profiled to get phase costs and peak memory.
+
+    The timed run has no instrumentation, the second run has a profiler and tracemalloc
+    attached, so its own wall clock is not reported.
+    """
+    world_width, world_height = world_size(num_agents)
+    config = simulation.Config(
+        num_agents=num_agents, max_days=days, seed=seed, gather_stats=True, show_view=False,
+        world_width=world_width, world_height=world_height, **ENGINES[engine]
+    )
+
+    start = time.perf_counter()
+    population = simulation.create_population(config)
+    setup_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    simulation.run_simulation(config, population)
+    step_seconds = time.perf_counter() - start
+    final_agents = len(population)
+
+    tracemalloc.start()
+    population = simulation.create_population(config)
+    with tempfile.TemporaryDirectory() as directory:
+        population.profiler = profiling.Profiler(pathlib.Path(directory) / profiling.PROFILE_PATH.name)
+        simulation.run_simulation(config, population)
+        population.profiler.close()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    profiler = population.profiler
+    return {
+        "engine": engine,
+        "agents": num_agents,
+        "days": days,
+        "seed": seed,
+        "final_agents": final_agents,
+        "setup_seconds": setup_seconds,
+        "days_per_second": days / step_seconds if step_seconds > 0 else float("inf"),
+        "peak_memory_mb": peak_bytes / 2 ** 20,
+        "phase_seconds_per_day": {phase: profiler.total_times[phase] / days for phase in profiling.PHASES},
+        "counts_per_day": {counter: profiler.total_counts[counter] / days for counter in profiling.COUNTERS},
+    }
+
+
+def run_benchmark(engines, sizes, days, seed):
+    """Results of every engine and size, each case in a fresh process so memory of one does not count in the next."""
+    results = []
+    print(f"{'Engine':<16}{'Agents':>10}{'Days/s':>12}{'Peak MB':>10}  Slowest phases (ms per day)")
+    for num_agents in sizes:
+        for engine in engines:
+            if not ENGINES[engine].get("use_vectorized_engine") and num_agents > REFERENCE_MAX_AGENTS:
+                print(f"{engine:<16}{num_agents:>10}{'skipped':>12}", flush=True)
+                continue
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_case, engine, num_agents, days, seed).result()
+            results.append(result)
+
+            phases = sorted(result["phase_seconds_per_day"].items(), key=lambda item: -item[1])[:3]
+            slowest = ", ".join(f"{phase} {seconds * 1000:.1f}" for phase, seconds in phases)
+            print(f"{engine:<16}{num_agents:>10}{result['days_per_second']:>12.2f}{result['peak_memory_mb']:>10.1f}  {slowest}", flush=True)
+    return results
+
+
+def run_curves(num_agents, days, seed, mean_field):
+    """Compartment counts of every day (day x S, I, R) and wall clock of one vectorized run."""
+    world_width, world_height = world_size(num_agents)
+    config = simulation.Config(
+        num_agents=num_agents, max_days=days, seed=seed, use_vectorized_engine=True,
+        mean_field_infection=mean_field, gather_stats=True, show_view=False, world_width=world_width, world_height=world_height
+    )
+    start = time.perf_counter()
+    stats = simulation.run_simulation(config)
+    return [row[:len(COMPARTMENTS)] for row in stats], time.perf_counter() - start
+
+
+def run_forwarded(num_agents, days, seed, fast_forward):
+    """Stats rows and stopping day (None if it ran to the end) of one vectorized run of the short epidemic."""
+    world_width, world_height = world_size(num_agents)
+    config = simulation.Config(
+        num_agents=num_agents, max_days=days, seed=seed, use_vectorized_engine=True, gather_stats=True, show_view=False,
+        world_width=world_width, world_height=world_height, fast_forward=fast_forward,
+        stop_after_quiet_days=FAST_FORWARD_QUIET_DAYS if fast_forward else 0, **FAST_FORWARD_EPIDEMIC
+    )
+    population = simulation.create_population(config)
+    stats = simulation.run_simulation(config, population)
+    return stats, None if population.stopped is None else population.stopped[0]
+
+
+def fast_forward_error(sizes, days, replicates, seed):
+    """How far fast-forwarded runs end from full runs of the same seeds.
+
+    Replicate n runs with seed + n, both ways. Births are counted after the stopping day of
+    the fast-forwarded run, errors are in percent of the full runs' totals over all replicates.
+    """
+    births = simulation.STATS_COLUMNS.index("Births") - 1
+    results = []
+    print(f"{'Agents':>10}{'Stopped':>9}{'Births full':>13}{'forwarded':>11}{'error %':>9}  Last day S/I/R error %")
+    for num_agents in sizes:
+        with concurrent.futures.ProcessPoolExecutor() as pool:
+            runs = {forward: list(pool.map(run_forwarded, *zip(*[(num_agents, days, seed + n, forward) for n in range(replicates)])))
+                    for forward in (False, True)}
+        stops = [stopped for _, stopped in runs[True]]
+        full = [np.array(stats) for stats, _ in runs[False]]
+        forwarded = [np.array(stats) for stats, _ in runs[True]]
+        later = [stop is not None for stop in stops]
+        births_full = sum(rows[stop + 1:, births].sum() for rows, stop, ended in zip(full, stops, later) if ended)
+        births_forwarded = sum(rows[stop + 1:, births].sum() for rows, stop, ended in zip(forwarded, stops, later) if ended)
+        last_full = np.sum([rows[-1, :len(COMPARTMENTS)] for rows in full], axis=0)
+        last_forwarded = np.sum([rows[-1, :len(COMPARTMENTS)] for rows in forwarded], axis=0)
+        births_error = (births_forwarded - births_full) / max(1, births_full) * 100
+        last_error = (last_forwarded - last_full) / np.maximum(1, last_full) * 100
+        print(f"{num_agents:>10}{sum(later):>9}{births_full:>13}{births_forwarded:>11}{births_error:>9.1f}  "
+              + " / ".join(f"{error:.1f}" for error in last_error), flush=True)
+        results.append({
+            "agents": num_agents,
+            "days": days,
+            "replicates": replicates,
+            "seed": seed,
+            "stopped_runs": sum(later),
+            "births_after_stop": {"full": int(births_full), "forwarded": int(births_forwarded)},
+            "last_day_error_percent": dict(zip(COMPARTMENTS, last_error.tolist())),
+        })
+    return results
+
+
+def mean_field_error(sizes, days, replicates, seed):
+    """How far mean-field S/I/R curves are from the exact pairwise ones, averaged over replicates.
+
+    Replicate n of both modes uses seed + n. Errors are in percent of the starting population:
+    the largest daily difference of the mean curves, and for scale the spread (standard
+    deviation) between exact replicates on the same day, largest over the days.
+    """
+    results = []
+    print(f"{'Agents':>10}{'Compartment':>14}{'Max error %':>14}{'Exact spread %':>16}")
+    for num_agents in sizes:
+        curves, seconds = {}, {}
+        for mean_field in (False, True):
+            with concurrent.futures.ProcessPoolExecutor() as pool:
+                runs = list(pool.map(run_curves, *zip(*[(num_agents, days, seed + n, mean_field) for n in range(replicates)])))
+            curves[mean_field] = np.array([run for run, _ in runs], dtype=np.float64) / num_agents * 100
+            seconds[mean_field] = sum(elapsed for _, elapsed in runs)
+
+        exact, approximate = curves[False], curves[True]
+        error = np.abs(approximate.mean(axis=0) - exact.mean(axis=0)).max(axis=0)
+        spread = exact.std(axis=0).max(axis=0)
+        for column, column_error, column_spread in zip(COMPARTMENTS, error, spread):
+            print(f"{num_agents:>10}{column:>14}{column_error:>14.2f}{column_spread:>16.2f}")
+        print(f"{num_agents:>10}{'speedup':>14}{seconds[False] / seconds[True]:>14.2f}x", flush=True)
+        results.append({
+            "agents": num_agents,
+            "days": days,
+            "replicates": replicates,
+            "seed": seed,
+            "max_error_percent": dict(zip(COMPARTMENTS, error.tolist())),
+            "exact_spread_percent": dict(zip(COMPARTMENTS, spread.tolist())),
+            "speedup": seconds[False] / seconds[True],
+        })
+    return results
+
+
+def git_commit():
+    """Hash of the checked out commit, None outside a git repository."""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def compare(results, previous):
+    """Prints days per second of every case against the same case in a previous results file."""
+    before = {(result["engine"], result["agents"]): result for result in previous["results"]}
+    print(f"Compared to {previous['commit'] or 'unknown commit'}:")
+    for result in results:
+        old = before.get((result["engine"], result["agents"]))
+        if old is None or old["days"] != result["days"] or old["seed"] != result["seed"]: continue
+        print(f"{result['engine']:<16}{result['agents']:>10}{old['days_per_second']:>12.2f} -> {result['days_per_second']:.2f} days/s"
+              f" ({result['days_per_second'] / old['days_per_second']:.2f}x)")
+
+
+
+# --- Main ---
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Measures days per second, peak memory and phase costs of the simulation step at fixed seeds."
+    )
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--sizes", nargs="+", type=int, metavar="AGENTS", help=f"population sizes on start, {SIZES} by default ({MEAN_FIELD_SIZES} with --mean-field)")
+    parser.add_argument("--days", type=int, help=f"simulated days of every case, {DAYS} by default ({MEAN_FIELD_DAYS} with --mean-field)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", type=pathlib.Path, help=f"results JSON file, {BENCHMARK_PATH}/[mean-field-|fast-forward-]<commit>.json by default")
+    parser.add_argument("--compare", type=pathlib.Path, metavar="RESULTS", help="results JSON file of an earlier run to compare with")
+    parser.add_argument("--mean-field", action="store_true",
+                        help=f"instead compare S/I/R curves of mean-field and exact infection, {MEAN_FIELD_DAYS} days of "
+                             f"{MEAN_FIELD_REPLICATES} replicates by default")
+    parser.add_argument("--fast-forward", action="store_true",
+                        help=f"instead compare fast-forwarded runs of a short epidemic with full ones, {FAST_FORWARD_DAYS} days of "
+                             f"{FAST_FORWARD_REPLICATES} replicates of {FAST_FORWARD_SIZES} agents by default")
+    parser.add_argument("--replicates", type=int, help="runs of every size and mode with --mean-field or --fast-forward")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    commit = git_commit()
+    if args.mean_field:
+        results = mean_field_error(args.sizes or MEAN_FIELD_SIZES, args.days or MEAN_FIELD_DAYS, args.replicates or MEAN_FIELD_REPLICATES, args.seed)
+        name = f"mean-field-{commit or time.strftime('%Y%m%d-%H%M%S')}.json"
+    elif args.fast_forward:
+        results = fast_forward_error(
+            args.sizes or FAST_FORWARD_SIZES, args.days or FAST_FORWARD_DAYS, args.replicates or FAST_FORWARD_REPLICATES, args.seed
+        )
+        name = f"fast-forward-{commit or time.strftime('%Y%m%d-%H%M%S')}.json"
+    else:
+        results = run_benchmark(args.engines, args.sizes or SIZES, args.days or DAYS, args.seed)
+        name = f"{commit or time.strftime('%Y%m%d-%H%M%S')}.json"
+
+    output = args.output or BENCHMARK_PATH / name
+    if not output.parent.exists():
+        output.parent.mkdir(parents=True)
+    with open(output, "w") as file:
+        json.dump({"commit": commit, "python": platform.python_version(), "machine": platform.machine(), "results": results}, file, indent=4)
+    print(f"Results saved to {output}")
+
+    if args.compare is not None and not args.mean_field and not args.fast_forward:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import dataclasses
+import json
+import pathlib
+
+import numpy as np
+
+import parallel
+import simulation
+
+
+
+# --- Constants ---
+
+CHECKPOINT_PATH = pathlib.Path("./checkpoints")
+ENGINES = {simulation.AgentPopulation: "agents", simulation.VectorizedPopulation: "vectorized", parallel.ParallelPopulation: "parallel"}
+
+
+
+# --- Checkpoints ---
+
+def checkpoint_path(directory, day, prefix=""):
+    return pathlib.Path(directory) / f"{prefix}day-{day:05d}.npz"
+
+
+def save_checkpoint(path, population, day, stats):
+    """Saves the whole state after the given day to a compressed columnar .npz file.
+
+    Random streams are derived from (seed, day, phase), so the seed stored with the
+    config is all that is needed to continue with exactly the same numbers.
+    """
+    path = pathlib.Path(path)
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+
+    columns = {f"agent_{name}": values for name, values in population.to_columns().items()}
+    np.savez_compressed(
+        path,
+        config=json.dumps(dataclasses.asdict(population.config)),
+        engine=ENGINES[type(population)],
+        day=day,
+        stats=np.array(list(stats), dtype=np.int64).reshape(-1, len(simulation.STATS_COLUMNS) - 1),
+        **columns
+    )
+
+
+def load_checkpoint(path):
+    """Config, agent columns, day and stats rows saved by save_checkpoint."""
+    with np.load(path, allow_pickle=False) as data:
+        config = simulation.Config(**json.loads(str(data["config"])))
+        columns = {name.removeprefix("agent_"): data[name] for name in data.files if name.startswith("agent_")}
+        day = int(data["day"])
+        stats = data["stats"]
+    # Checkpoints from before the extra stats columns, their rows get zeros there
+    missing = len(simulation.STATS_COLUMNS) - 1 - stats.shape[1]
+    stats = np.pad(stats, ((0, 0), (0, missing))).tolist()
+    return config, columns, day, stats
+
+
+def resume(path, config=None):
+    """Population, day and stats to continue a run from the checkpoint.
+
+    config replaces the saved one, e.g. to branch a what-if scenario from a common warm-up
+    or to switch the engine, the saved agents are loaded into whichever engine it selects.
+    """
+    saved_config, columns, day, stats = load_checkpoint(path)
+    population = simulation.create_population(config or saved_config, columns)
+    return population, day, stats
+
+
+def checkpointer(directory, every, prefix=""):
+    """on_day callback for run_simulation saving a checkpoint every given number of days."""
+    def on_day(population, day, stats):
+        if every > 0 and day % every == 0:
+            save_checkpoint(checkpoint_path(directory, day, prefix), population, day, stats)
+    return on_day
@@ -0,0 +1,154 @@
+import argparse
+import json
+import pathlib
+import sys
+import time
+import tomllib
+
+import checkpoint
+import profiling
+import recording
+import results
+import simulation
+import streaming
+
+
+
+# --- Scenarios ---
+
+def load_scenario(path):
+    """Parameters from a TOML or JSON scenario file, keyed by Config field name (e.g. infection_radius)."""
+    path = pathlib.Path(path)
+    with open(path, "rb") as file:
+        if path.suffix == ".toml": scenario = tomllib.load(file)
+        elif path.suffix == ".json": scenario = json.load(file)
+        else: raise ValueError(f"Unsupported scenario file type: {path}")
+
+    scenario = {key.lower(): value for key, value in scenario.items()}
+    unknown = [key for key in scenario if key not in simulation.PARAMETER_LABELS]
+    if unknown: raise ValueError(f"Unknown parameters in {path}: {', '.join(unknown)}")
+    return scenario
+
+
+def to_param_string(value):
+    """Value from a scenario file in the form typed on the start screen."""
+    if isinstance(value, (list, tuple)): return ", ".join(str(x) for x in value)
+    return str(value)
+
+
+def build_params(defaults, *overrides):
+    """Start screen params (keyed by label) with defaults replaced by every override in turn."""
+    params = dict(defaults)
+    for override in overrides:
+        for name, value in override.items():
+            params[simulation.PARAMETER_LABELS[name]] = to_param_string(value)
+    return params
+
+
+
+# --- Main ---
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Runs the simulation without the pygame view. Flags override values from scenario files."
+    )
+    parser.add_argument("scenarios", nargs="*", type=pathlib.Path, help="TOML or JSON scenario files, run one after another")
+    parser.add_argument("--output-dir", type=pathlib.Path, default=simulation.STATS_PATH.parent, help="directory for stats files")
+    parser.add_argument("--checkpoint-dir", type=pathlib.Path, default=checkpoint.CHECKPOINT_PATH, help="directory for checkpoints")
+    parser.add_argument("--stats-format", choices=("csv", "parquet"), default="csv", help="format of the stats file, parquet needs pyarrow")
+    parser.add_argument("--record", action="store_true", help="record positions and statuses of every day for replay.py")
+    parser.add_argument("--resume", type=pathlib.Path, metavar="CHECKPOINT", help="continue from a checkpoint, its parameters are the defaults")
+    parser.add_argument("--store", type=pathlib.Path, default=results.RESULTS_PATH, help="results store of finished runs")
+    parser.add_argument("--no-cache", action="store_true", help="simulate even when the store has a run with the same parameters")
+    parser.add_argument("--publish", metavar="ADDRESS", nargs="?", const=streaming.PUBLISH_ADDRESS,
+                        help=f"send live stats to monitor.py, on {streaming.PUBLISH_ADDRESS} when no address is given")
+    for name, label in simulation.PARAMETER_LABELS.items():
+        parser.add_argument("--" + name.replace("_", "-"), dest=name, metavar="VALUE", help=label.strip())
+    return parser.parse_args(argv)
+
+
+def chain(*callbacks):
+    """on_day callback calling all the given ones in turn."""
+    def on_day(population, day, stats):
+        for callback in callbacks: callback(population, day, stats)
+    return on_day
+
+
+def cacheable(args, config):
+    """Whether a stored run can stand in for this one, runs with other outputs than stats are simulated."""
+    return (
+        not args.no_cache and args.resume is None and config.gather_stats and not args.record and args.publish is None
+        and config.checkpoint_every == 0 and not config.log_events and not config.profile
+    )
+
+
+def file_prefix(scenario):
+    return "" if scenario is None else f"{scenario.stem}-"
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    flags = {name: getattr(args, name) for name in simulation.PARAMETER_LABELS if getattr(args, name) is not None}
+    if args.resume is None: defaults = simulation.get_params(simulation.Config())
+    else: defaults = simulation.get_params(checkpoint.load_checkpoint(args.resume)[0])
+
+    for scenario in args.scenarios or [None]:
+        scenario_params = {} if scenario is None else load_scenario(scenario)
+        config = simulation.resolve_seed(simulation.parse_params(build_params(defaults, scenario_params, flags)))
+        name = "default scenario" if scenario is None else scenario.name
+        stats_name = file_prefix(scenario) + simulation.STATS_PATH.with_suffix("." + args.stats_format).name
+
+        if cacheable(args, config):
+            with results.ResultStore(args.store) as store: stored = store.get(config)
+            if stored is not None:
+                with streaming.StatsWriter(args.output_dir / stats_name, stored): pass
+                print(f"{name}: stored run {results.config_key(config)[:12]} reused (seed {config.seed})")
+                continue
+
+        population, day, stats = None, 0, None
+        if args.resume is not None: population, day, stats = checkpoint.resume(args.resume, config)
+        else: population = simulation.create_population(config)
+        on_day = checkpoint.checkpointer(args.checkpoint_dir, config.checkpoint_every, file_prefix(scenario))
+        recorder = None
+        if args.record:
+            recorder = recording.Recorder(args.output_dir / (file_prefix(scenario) + recording.RECORDING_PATH.name), config)
+            recorder.record(population, day)
+            on_day = chain(on_day, recorder)
+        publisher = None
+        if args.publish is not None:
+            publisher = streaming.StatsPublisher(args.publish)
+            publisher(population, day)
+            on_day = chain(on_day, publisher)
+
+        # Stats and events are written while the simulation runs
+        if config.gather_stats:
+            stats = streaming.StatsWriter(args.output_dir / stats_name, stats or ())
+        if config.log_events:
+            population.events = streaming.EventLog(args.output_dir / (file_prefix(scenario) + streaming.EVENTS_PATH.name))
+        if config.profile:
+            population.profiler = profiling.Profiler(args.output_dir / (file_prefix(scenario) + profiling.PROFILE_PATH.name))
+
+        start = time.perf_counter()
+        stats = simulation.run_simulation(config, population, day, stats, on_day)
+        elapsed = time.perf_counter() - start
+
+        if config.gather_stats:
+            stats.close()
+            if args.resume is None: # a resumed run may have started under another config
+                with results.ResultStore(args.store) as store: store.put(config, streaming.read_stats(stats.path))
+        if population.events is not None: population.events.close()
+        if recorder is not None: recorder.close()
+        if publisher is not None: publisher.close()
+
+        if population.stopped is None:
+            print(f"{name}: {config.max_days - day} days simulated in {elapsed:.2f} s (seed {config.seed})")
+        else:
+            stopped_day, reason = population.stopped
+            print(f"{name}: stopped on day {stopped_day} ({reason}), {stopped_day - day} days simulated in {elapsed:.2f} s (seed {config.seed})")
+        if population.profiler is not None:
+            population.profiler.close()
+            print(population.profiler.summary())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
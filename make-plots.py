@@ -1,141 +1,237 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
 import pathlib
 import sys
 
+import matplotlib
+matplotlib.use("Agg") # only files are written, also in worker processes
+import matplotlib.pyplot as plt
+import pandas as pd
+
+
+
+# --- Constants ---
+
+PLOT_PATH = pathlib.Path("./plots")
+STATS_PATH = pathlib.Path("./stats/total-counts.csv")
+CACHE_PATH = PLOT_PATH / "plot-cache.json" # hash of the input of every plotted prefix
+DPI = 300
+RUN_FIGURES = ["total-counts", "total-percentages", "vaccinations", "total-delta", "total-sum", "total-counts-delta"]
+ENSEMBLE_FIGURES = ["ensemble-counts", "ensemble-infected"]
+COMPARTMENTS = [("Susceptible", "Podatni", 'blue'), ("Infected", "Zarażeni", 'red'), ("Recovered", "Wyzdrowiali", 'green')]
+
+
+
+# --- Plots ---
+
+def day_ticks(days):
+    last = days.max()
+    xticks = list(range(0, last + 1, max(1, last // 20)))
+    xticks[-1] = last
+    return xticks
+
+
+def save(path):
+    plt.legend()
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    plt.tight_layout()
+    plt.savefig(path, dpi=DPI)
+    plt.close()
+
+
+def plot_run(df, prefix):
+    """Figures of a single run from its stats file."""
+    xticks = day_ticks(df['Day'])
+
+    # Plot with total counts
+    plt.figure(figsize=(12, 8))
+    for column, label, color in COMPARTMENTS:
+        plt.plot(df['Day'], df[column], label=label, color=color)
+    plt.title("Wykres symulacji epidemii")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Liczba osób")
+    save(PLOT_PATH / f"{prefix}_total-counts.png")
+
+    # Plot with percentages
+    df['Total'] = df['Susceptible'] + df['Infected'] + df['Recovered']
+    plt.figure(figsize=(12, 8))
+    for column, label, color in COMPARTMENTS:
+        plt.plot(df['Day'], df[column] / df['Total'] * 100, label=label, color=color)
+    plt.title("Wykres symulacji epidemii (wartości procentowe)")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Udział w populacji [%]")
+    plt.yticks(range(0, 101, 10))
+    save(PLOT_PATH / f"{prefix}_total-percentages.png")
+
+    # Plot with vaccination
+    plt.figure(figsize=(12, 8))
+    plt.plot(df['Day'], df['Vaccined'], label="Zaszczepieni", color='orange')
+    plt.title("Wykres codziennych szczepień")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Liczba zaszczepionych osób")
+    plt.yticks(range(0, df['Vaccined'].max() + 1, max(1, df['Vaccined'].max() // 20)))
+    save(PLOT_PATH / f"{prefix}_vaccinations.png")
+
+    # Plot with total differences
+    plt.figure(figsize=(12, 8))
+    plt.plot(df['Day'], df['Total'].diff(), label="Zmiana liczebności populacji", color='black')
+    plt.title("Wykres zmiany liczebności populacji")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Różnica w liczbie osób")
+    save(PLOT_PATH / f"{prefix}_total-delta.png")
+
+    # Plot with total sum
+    plt.figure(figsize=(12, 8))
+    plt.plot(df['Day'], df['Total'], label="Liczebność", color='Purple')
+    plt.title("Wykres całkowitej liczebności populacji")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Liczba osób")
+    save(PLOT_PATH / f"{prefix}_total-sum.png")
+
+    # Plot with count difference
+    plt.figure(figsize=(12, 8))
+    for column, label, color in COMPARTMENTS:
+        plt.plot(df['Day'], df[column].diff(), label=label, color=color)
+    plt.title("Wykres symulacji epidemii (zmiany liczby osób)")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Zmiana liczby osób")
+    save(PLOT_PATH / f"{prefix}_total-counts-delta.png")
+
+
+def plot_band(df, column, label, color):
+    """Mean of the column with 5-95 and 25-75 quantile bands of summary.csv written by sweep.py."""
+    plt.fill_between(df['Day'], df[f"{column}_q05"], df[f"{column}_q95"], color=color, alpha=0.15)
+    plt.fill_between(df['Day'], df[f"{column}_q25"], df[f"{column}_q75"], color=color, alpha=0.3)
+    plt.plot(df['Day'], df[f"{column}_mean"], label=label, color=color)
+
+
+def plot_ensemble(df, prefix):
+    """Figures of all replicates of a sweep point from its summary file."""
+    xticks = day_ticks(df['Day'])
+
+    plt.figure(figsize=(12, 8))
+    for column, label, color in COMPARTMENTS:
+        plot_band(df, column, label, color)
+    plt.title("Wykres symulacji epidemii (średnia i kwantyle 5-95%, 25-75% replikacji)")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Liczba osób")
+    save(PLOT_PATH / f"{prefix}_ensemble-counts.png")
+
+    plt.figure(figsize=(12, 8))
+    plot_band(df, "Infected", "Zarażeni", 'red')
+    plt.title("Wykres liczby zarażonych (średnia i kwantyle 5-95%, 25-75% replikacji)")
+    plt.xlabel("Dzień")
+    plt.xticks(xticks)
+    plt.ylabel("Liczba osób")
+    save(PLOT_PATH / f"{prefix}_ensemble-infected.png")
+
+
+def render(path, prefix, ensemble):
+    """Task of a worker process: all figures of one stats or summary file."""
+    df = pd.read_csv(path)
+    if ensemble: plot_ensemble(df, prefix)
+    else: plot_run(df, prefix)
+    return prefix
+
+
+
+# --- Inputs ---
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2 ** 20), b""): digest.update(block)
+    return digest.hexdigest()
+
+
+def input_kind(path):
+    """"ensemble" for sweep summaries, "run" for stats files, None for other CSV files."""
+    columns = pd.read_csv(path, nrows=0).columns
+    if "Infected_mean" in columns: return "ensemble"
+    if "Infected" in columns: return "run"
+    return None
+
+
+def find_inputs(paths):
+    """(path, prefix of figure names, kind) of every stats and summary file in the given files and directories."""
+    inputs = []
+    for path in paths:
+        if path.is_dir():
+            for file in sorted(path.rglob("*.csv")):
+                parts = (path.name, *file.relative_to(path).with_suffix("").parts)
+                inputs.append((file, "_".join(parts)))
+        else:
+            inputs.append((path, path.stem))
+    return [(path, prefix, kind) for path, prefix in inputs if (kind := input_kind(path)) is not None]
+
+
+def up_to_date(cache, prefix, kind, digest):
+    figures = ENSEMBLE_FIGURES if kind == "ensemble" else RUN_FIGURES
+    if cache.get(prefix) != digest: return False
+    return all((PLOT_PATH / f"{prefix}_{figure}.png").exists() for figure in figures)
+
+
+
+# --- Main ---
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Plots stats files, sweep directories give also mean and quantile plots of every point. "
+                    "Files are plotted in parallel, files not changed since they were last plotted are skipped."
+    )
+    parser.add_argument("inputs", nargs="+", help=f"stats files or directories, a single experiment index plots {STATS_PATH} with it as the name")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--force", action="store_true", help="plot also files that did not change")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if len(args.inputs) == 1 and args.inputs[0].lstrip("-").isdigit(): # the original usage: make-plots.py <experiment index>
+        experiment_index = int(args.inputs[0])
+        if experiment_index <= 0:
+            print("Experiment index must be a positive integer.")
+            return 1
+        inputs = [(STATS_PATH, str(experiment_index), "run")]
+    else:
+        inputs = find_inputs([pathlib.Path(path) for path in args.inputs])
+
+    if not PLOT_PATH.exists():
+        PLOT_PATH.mkdir(parents=True)
+    cache = {}
+    if CACHE_PATH.exists():
+        with open(CACHE_PATH) as file:
+            cache = json.load(file)
+
+    digests = {prefix: file_hash(path) for path, prefix, _ in inputs}
+    todo = [
+        (path, prefix, kind) for path, prefix, kind in inputs
+        if args.force or not up_to_date(cache, prefix, kind, digests[prefix])
+    ]
+    print(f"{len(inputs) - len(todo)} of {len(inputs)} files unchanged, plotting {len(todo)}")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(render, path, prefix, kind == "ensemble") for path, prefix, kind in todo]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            cache[future.result()] = digests[future.result()]
+            print(f"\r{done}/{len(futures)} files plotted", end="", flush=True)
+    print()
+
+    with open(CACHE_PATH, "w") as file:
+        json.dump(cache, file, indent=4)
+    print("Done saving plots.")
+
 
-if len(sys.argv) > 1:
-    experiment_index = int(sys.argv[1])
-else:
-    print(f"Usage: {sys.argv[0]} <experiment index>")
-    sys.exit(1)
-
-if experiment_index <= 0:
-    print("Experiment index must be a positive integer.")
-    sys.exit(1)
-
-
-plot_path = pathlib.Path("./plots")
-if not plot_path.exists():
-    plot_path.mkdir(parents=True)
-
-df = pd.read_csv('./stats/total-counts.csv')
-
-
-# Plot with total counts
-plt.figure(figsize=(12, 8))
-plt.plot(df['Day'], df['Susceptible'], label="Podatni", color='blue')
-plt.plot(df['Day'], df['Infected'], label="Zarażeni", color='red')
-plt.plot(df['Day'], df['Recovered'], label="Wyzdrowiali", color='green')
-
-plt.title("Wykres symulacji epidemii")
-plt.xlabel("Dzień")
-xticks = []
-xticks.extend(range(0, df['Day'].max() + 1, df['Day'].max() // 20))
-xticks[-1] = (df['Day'].max())
-plt.xticks(xticks)
-plt.ylabel("Liczba osób")
-plt.legend()
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig(f'./plots/{experiment_index}_total-counts.png', dpi=300)
-plt.close()
-
-
-# Plot with percentages
-df['Total'] = df['Susceptible'] + df['Infected'] + df['Recovered']
-df['Susceptible_P'] = df['Susceptible'] / df['Total'] * 100
-df['Infected_P'] = df['Infected'] / df['Total'] * 100
-df['Recovered_P'] = df['Recovered'] / df['Total'] * 100
-
-plt.figure(figsize=(12, 8))
-plt.plot(df['Day'], df['Susceptible_P'], label="Podatni", color='blue')
-plt.plot(df['Day'], df['Infected_P'], label="Zarażeni", color='red')
-plt.plot(df['Day'], df['Recovered_P'], label="Wyzdrowiali", color='green')
-
-plt.title("Wykres symulacji epidemii (wartości procentowe)")
-plt.xlabel("Dzień")
-plt.xticks(xticks)
-plt.ylabel("Udział w populacji [%]")
-plt.yticks(range(0, 101, 10))
-plt.legend()
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig(f'./plots/{experiment_index}_total-percentages.png', dpi=300)
-plt.close()
-
-
-# Plot with vaccination
-plt.figure(figsize=(12, 8))
-plt.plot(df['Day'], df['Vaccined'], label="Zaszczepieni", color='orange')
-
-plt.title("Wykres codziennych szczepień")
-plt.xlabel("Dzień")
-plt.xticks(xticks)
-plt.ylabel("Liczba zaszczepionych osób")
-plt.yticks(range(0, df['Vaccined'].max() + 1, 1))
-
-plt.legend()
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig(f'./plots/{experiment_index}_vaccinations.png', dpi=300)
-plt.close()
-
-
-# Plot with total differences
-plt.figure(figsize=(12, 8))
-df['Total'] = df['Susceptible'] + df['Infected'] + df['Recovered']
-df['Delta'] = df['Total'].diff()
-
-plt.plot(df['Day'], df['Delta'], label="Zmiana liczebności populacji", color='black')
-
-plt.title("Wykres zmiany liczebności populacji")
-plt.xlabel("Dzień")
-plt.xticks(xticks)
-plt.ylabel("Różnica w liczbie osób")
-plt.legend()
-plt.tight_layout()
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.savefig(f'./plots/{experiment_index}_total-delta.png', dpi=300)
-plt.close()
-
-
-# Plot with total sum
-df['Total'] = df['Susceptible'] + df['Infected'] + df['Recovered']
-
-plt.figure(figsize=(12, 8))
-plt.plot(df['Day'], df['Total'], label="Liczebność", color='Purple')
-
-
-plt.title("Wykres całkowitej liczebności populacji")
-plt.xlabel("Dzień")
-plt.xticks(xticks)
-plt.ylabel("Liczba osób")
-plt.legend()
-plt.tight_layout()
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.savefig(f'./plots/{experiment_index}_total-sum.png', dpi=300)
-plt.close()
-
-
-# Plot with count difference
-df['Susceptible_D'] = df['Susceptible'].diff()
-df['Infected_D'] = df['Infected'].diff()
-df['Recovered_D'] = df['Recovered'].diff()
-
-plt.figure(figsize=(12, 8))
-plt.plot(df['Day'], df['Susceptible_D'], label="Podatni", color='blue')
-plt.plot(df['Day'], df['Infected_D'], label="Zarażeni", color='red')
-plt.plot(df['Day'], df['Recovered_D'], label="Wyzdrowiali", color='green')
-
-plt.title("Wykres symulacji epidemii (zmiany liczby osób)")
-plt.xlabel("Dzień")
-plt.xticks(xticks)
-plt.ylabel("Zmiana liczby osób")
-plt.legend()
-plt.tight_layout()
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.savefig(f'./plots/{experiment_index}_total-counts-delta.png', dpi=300)
-plt.close()
-
-print("Done saving plots.")
+if __name__ == "__main__":
+    sys.exit(main())
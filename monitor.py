@@ -0,0 +1,94 @@
+import argparse
+import json
+import socket
+import sys
+
+import streaming
+
+
+
+# --- Constants ---
+
+HISTORY = 2000 # days kept by the live plot
+COMPARTMENTS = [("Susceptible", 'blue'), ("Infected", 'red'), ("Recovered", 'green')]
+
+
+
+# --- Subscribers ---
+
+def connect(address):
+    family, address = streaming.parse_address(address)
+    connection = socket.socket(family, socket.SOCK_STREAM)
+    connection.connect(address)
+    return connection
+
+
+def receive(connection):
+    """Stats of every day sent by the publisher, until it closes the connection."""
+    with connection.makefile("r") as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def dashboard(days):
+    """One terminal line with the latest day, rewritten in place."""
+    for stats in days:
+        rate = 1 / stats["Seconds"] if stats["Seconds"] > 0 else float("inf")
+        print(f"\rDay {stats['Day']:>6}  S {stats['Susceptible']:>8}  I {stats['Infected']:>8}  R {stats['Recovered']:>8}"
+              f"  V {stats['Vaccined']:>6}  deaths {stats['Deaths']:>5}  {rate:8.1f} days/s", end="", flush=True)
+    print()
+
+
+def live_plot(days):
+    """Compartment counts of the last HISTORY days in a matplotlib window."""
+    import matplotlib.pyplot as plt
+
+    plt.ion()
+    figure, axes = plt.subplots(figsize=(12, 8))
+    lines = {column: axes.plot([], [], label=column, color=color)[0] for column, color in COMPARTMENTS}
+    axes.set_xlabel("Dzień")
+    axes.set_ylabel("Liczba osób")
+    axes.legend()
+    history = []
+
+    for stats in days:
+        history = history[-HISTORY + 1:] + [stats]
+        for column, line in lines.items():
+            line.set_data([s["Day"] for s in history], [s[column] for s in history])
+        axes.relim()
+        axes.autoscale_view()
+        axes.set_title(f"Dzień {stats['Day']}")
+        figure.canvas.draw_idle()
+        plt.pause(0.001)
+    plt.ioff()
+    plt.show()
+
+
+
+# --- Main ---
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Shows live stats of a run started with headless.py --publish.")
+    parser.add_argument("address", nargs="?", default=streaming.PUBLISH_ADDRESS, help='"host:port", "port" or "unix:<path>"')
+    parser.add_argument("--plot", action="store_true", help="live matplotlib plot instead of the terminal line")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        connection = connect(args.address)
+    except OSError as error:
+        print(f"Cannot connect to {args.address}: {error}")
+        return 1
+
+    days = receive(connection)
+    try:
+        if args.plot: live_plot(days)
+        else: dashboard(days)
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import concurrent.futures
+import dataclasses
+import math
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import simulation
+from rng import Phase, agent_uniform
+from simulation import AGENT_COLUMNS, Status
+
+
+
+# --- Constants ---
+
+# Columns in shared memory, agent state and the flags of the current day
+SHARED_COLUMNS = {
+    "ids": np.int64,
+    **AGENT_COLUMNS,
+    "dead": np.bool_,
+    "infected_today": np.bool_,
+    "cured_today": np.bool_,
+}
+MIN_CAPACITY = 1024 # agents, shared columns grow twice when full
+
+
+
+# --- Shared memory ---
+
+class SharedColumns:
+    """Per agent columns in shared memory blocks, with room for capacity agents."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.blocks = {
+            name: shared_memory.SharedMemory(create=True, size=max(1, capacity * np.dtype(dtype).itemsize))
+            for name, dtype in SHARED_COLUMNS.items()
+        }
+        self.arrays = {name: np.ndarray(capacity, dtype=dtype, buffer=self.blocks[name].buf) for name, dtype in SHARED_COLUMNS.items()}
+
+    def names(self):
+        return {name: block.name for name, block in self.blocks.items()}
+
+    def release(self):
+        """Unlinks the blocks, their memory is freed once no array of this process uses it."""
+        self.arrays = {}
+        for block in self.blocks.values(): block.unlink()
+        self.blocks = {}
+
+
+ATTACHED = {"names": None, "blocks": [], "arrays": {}} # shared columns of the parent, as seen by a worker process
+
+
+def attach(layout):
+    """Columns of the layout in a worker, attached again only when the parent replaced them."""
+    if ATTACHED["names"] != layout.names:
+        ATTACHED["arrays"] = {} # no views of the old blocks are left once the previous phase returned
+        for block in ATTACHED["blocks"]: block.close()
+        blocks = {name: shared_memory.SharedMemory(name=block_name) for name, block_name in layout.names.items()}
+        ATTACHED["names"] = layout.names
+        ATTACHED["blocks"] = list(blocks.values())
+        ATTACHED["arrays"] = {
+            name: np.ndarray(layout.capacity, dtype=dtype, buffer=blocks[name].buf) for name, dtype in SHARED_COLUMNS.items()
+        }
+    return {name: array[:layout.count] for name, array in ATTACHED["arrays"].items()}
+
+
+@dataclasses.dataclass
+class Layout:
+    """What a worker needs to find its agents: shared block names, agent count and tile bounds."""
+    names: dict
+    capacity: int
+    count: int
+    config: simulation.Config
+    day: int
+    tiles: int
+    tile_starts: list # index of the first agent of every tile (and the count at the end) after migration
+
+    def tile_width(self):
+        return self.config.world_width / self.tiles
+
+
+
+# --- Worker phases ---
+
+def uniform(config, day, phase, ids, draw=0):
+    return agent_uniform(config.seed, day, phase, ids, draw)
+
+
+def move_and_age(layout, lo, hi):
+    """Moves agents lo..hi and does their bookkeeping up to death due to disease, returns counts of the changes.
+
+    Agents are independent in this phase, so the parent splits them evenly, not by tile.
+    """
+    columns = attach(layout)
+    config, day = layout.config, layout.day
+    ids = columns["ids"][lo:hi]
+    x, y = columns["x"][lo:hi], columns["y"][lo:hi]
+    status = columns["status"][lo:hi]
+    immune_days, days_old = columns["immune_days"][lo:hi], columns["days_old"][lo:hi]
+
+    # Move, as VectorizedPopulation.move
+    max_speed = config.max_speed * config.day_in_week_modifier[day % 7]
+    moving = np.flatnonzero(uniform(config, day, Phase.Move, ids, 0) >= config.no_move_probability)
+    speed = np.where(columns["fearful"][lo:hi][moving], max_speed / 2, max_speed)
+    x[moving] = np.clip(x[moving] + (2 * uniform(config, day, Phase.Move, ids[moving], 1) - 1) * speed, 0, config.world_width)
+    y[moving] = np.clip(y[moving] + (2 * uniform(config, day, Phase.Move, ids[moving], 2) - 1) * speed, 0, config.world_height)
+
+    # Aging and natural death, vaccination, immunity expiry and death due to disease, as VectorizedPopulation.simulate_day
+    days_old += 1
+    dead = (days_old >= config.min_days_to_live) & (uniform(config, day, Phase.Death, ids, 0) < config.normal_death_probability)
+    deaths = np.bincount(status[dead], minlength=Status.Recovered.value + 1)
+
+    recovered = ~dead & (status == Status.Recovered.value)
+    vaccined = (
+        ~dead & ~columns["anti_vaccine"][lo:hi] & (status == Status.Susceptible.value)
+        & (uniform(config, day, Phase.Vaccination, ids) < config.vaccined_percentage)
+    )
+    status[vaccined] = Status.Recovered.value
+    immune_days[vaccined] = 0
+    immune_days[recovered] += 1
+    immunity_lost = recovered & (immune_days >= config.immunity_days)
+    status[immunity_lost] = Status.Susceptible.value
+
+    infected = ~dead & (status == Status.Infected.value)
+    disease_dead = infected & (uniform(config, day, Phase.Death, ids, 1) < config.disease_death_probability)
+    columns["dead"][lo:hi] = dead | disease_dead
+    columns["infected_today"][lo:hi] = False
+    columns["cured_today"][lo:hi] = False
+
+    return {
+        "deaths": deaths.tolist(),
+        "vaccined": int(np.count_nonzero(vaccined)),
+        "immunity_losses": int(np.count_nonzero(immunity_lost)),
+        "disease_deaths": int(np.count_nonzero(disease_dead)),
+    }
+
+
+def halo(layout, columns, tile, radius):
+    """Indices of agents of other tiles closer than radius to the strip of the tile."""
+    width = layout.tile_width()
+    reach = int(math.ceil(radius / width))
+    low, high = tile * width - radius, (tile + 1) * width + radius
+    found = []
+    for other in range(max(0, tile - reach), min(layout.tiles, tile + reach + 1)):
+        if other == tile: continue
+        first, last = layout.tile_starts[other], layout.tile_starts[other + 1]
+        x = columns["x"][first:last]
+        found.append(first + np.flatnonzero((x >= low) & (x <= high)))
+    return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+
+def contacts(layout, tile):
+    """Infection, cure and reproduction of the agents of one tile, neighbours of other tiles come from the halo.
+
+    Flags newly infected and cured agents (applied by the parent), returns their counts
+    and the parents and positions of children.
+    """
+    columns = attach(layout)
+    config, day = layout.config, layout.day
+    ids, x, y, status, dead = columns["ids"], columns["x"], columns["y"], columns["status"], columns["dead"]
+    own = np.arange(layout.tile_starts[tile], layout.tile_starts[tile + 1])
+    near = np.concatenate((own, halo(layout, columns, tile, max(config.infection_radius, config.reproduction_radius))))
+    near = near[np.argsort(ids[near], kind="stable")] # by id, the index order of the vectorized engine
+
+    # Infection, every infected neighbour is an independent chance of being infected
+    spreaders = near[~dead[near] & (status[near] == Status.Infected.value)]
+    targets = own[~dead[own] & (status[own] == Status.Susceptible.value)]
+    contacts_count = simulation.count_within_radius(
+        x[spreaders], y[spreaders], x[targets], y[targets], config.infection_radius, config.infection_radius
+    )
+    escape_probability = (1 - config.infection_probability) ** contacts_count
+    newly_infected = targets[uniform(config, day, Phase.Infection, ids[targets]) >= escape_probability]
+    columns["infected_today"][newly_infected] = True
+
+    # Cure of own spreaders
+    own_spreaders = own[~dead[own] & (status[own] == Status.Infected.value)]
+    columns["infected_days"][own_spreaders] += 1
+    cured = own_spreaders[
+        (columns["infected_days"][own_spreaders] >= config.min_infected_days)
+        & (uniform(config, day, Phase.Cure, ids[own_spreaders]) < config.cure_probability)
+    ]
+    columns["cured_today"][cured] = True
+
+    # Reproduction, every agent in range (itself included) is an independent chance
+    living = near[~dead[near]]
+    own_living = own[~dead[own]]
+    partners_count = simulation.count_within_radius(
+        x[living], y[living], x[own_living], y[own_living], config.reproduction_radius, config.infection_radius
+    )
+    no_child_probability = (1 - config.reproduction_probability) ** partners_count
+    parents = own_living[uniform(config, day, Phase.Reproduction, ids[own_living], 0) >= no_child_probability]
+    partners = living[simulation.pick_neighbor(
+        x[parents], y[parents], x[living], y[living], config.reproduction_radius, config.infection_radius,
+        uniform(config, day, Phase.Reproduction, ids[parents], 1), candidate_ids=ids[living]
+    )]
+
+    return {
+        "infections": len(newly_infected),
+        "cures": len(cured),
+        "parent_ids": ids[parents],
+        "child_x": (x[parents] + x[partners]) / 2,
+        "child_y": (y[parents] + y[partners]) / 2,
+    }
+
+
+
+# --- Population ---
+
+def shutdown(pool, shared):
+    pool.shutdown()
+    shared[0].release()
+
+
+class ParallelPopulation(simulation.VectorizedPopulation):
+    """Vectorized engine with the world split into vertical strips (tiles) handled by worker processes.
+
+    Agent columns live in shared memory. Every day workers first move and age evenly split
+    ranges of agents, then the parent sorts agents by tile (migration across tile borders),
+    then every tile is simulated by a worker reading neighbours of other tiles within the
+    infection and reproduction radius (the halo) straight from shared memory. Removing the
+    dead and adding newborns is done by the parent. Random numbers are drawn by agent id,
+    as in VectorizedPopulation. Event logs, profiling and the event calendar are not supported.
+    """
+
+    def __init__(self, config, columns=None):
+        if config.use_event_calendar: raise ValueError("The event calendar is not supported with several workers")
+        if config.mean_field_infection: raise ValueError("Mean-field infection is not supported with several workers")
+        if config.log_events: raise ValueError("Event logs are not supported with several workers")
+        if config.profile: raise ValueError("Profiling is not supported with several workers")
+        super().__init__(config, columns)
+        self.tiles = config.workers
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=config.workers)
+        self.shared = [SharedColumns(max(MIN_CAPACITY, 2 * len(self.ids)))] # in a list, so shutdown sees replacements
+        count = len(self.ids)
+        for name in ("ids", *AGENT_COLUMNS):
+            self.shared[0].arrays[name][:count] = getattr(self, name)
+        self.count = count
+        self.tile_starts = [0] * (self.tiles + 1)
+        self.bind()
+        weakref.finalize(self, shutdown, self.pool, self.shared)
+
+    def bind(self):
+        """Population attributes as views of the first count rows of shared columns."""
+        for name in ("ids", *AGENT_COLUMNS):
+            setattr(self, name, self.shared[0].arrays[name][:self.count])
+
+    def layout(self, day):
+        shared = self.shared[0]
+        return Layout(shared.names(), shared.capacity, self.count, self.config, day, self.tiles, list(self.tile_starts))
+
+    def to_columns(self):
+        order = np.argsort(self.ids, kind="stable") # other engines keep agents sorted by id
+        columns = {name: getattr(self, name)[order] for name in ("ids", *AGENT_COLUMNS)}
+        columns["next_id"] = np.array(self.next_id)
+        return columns
+
+    def step(self, day) -> int:
+        """Simulates one day, returns the number of agents vaccined today."""
+        self.lookup = None
+        self.counters.start_day()
+
+        layout = self.layout(day)
+        bounds = np.linspace(0, self.count, self.tiles + 1).astype(np.int64).tolist()
+        changes = list(self.pool.map(move_and_age, [layout] * self.tiles, bounds[:-1], bounds[1:]))
+        for change in changes:
+            for status_value, count in enumerate(change["deaths"]):
+                if count: self.counters.death(status_value, count)
+            self.counters.vaccinate(change["vaccined"])
+            self.counters.lose_immunity(change["immunity_losses"])
+            self.counters.disease_death(change["disease_deaths"])
+
+        self.migrate()
+        layout = self.layout(day)
+        results = list(self.pool.map(contacts, [layout] * self.tiles, range(self.tiles)))
+        self.counters.infect(sum(result["infections"] for result in results))
+        self.counters.cure(sum(result["cures"] for result in results))
+
+        self.end_day(day, results)
+        return self.counters.vaccined
+
+    def migrate(self):
+        """Sorts agents by the tile of their position, every tile is then a contiguous range."""
+        arrays = {name: array[:self.count] for name, array in self.shared[0].arrays.items()}
+        width = self.config.world_width / self.tiles
+        tile = np.minimum((arrays["x"] // width).astype(np.int64), self.tiles - 1)
+        order = np.argsort(tile, kind="stable")
+        for array in arrays.values(): array[:] = array[order]
+        self.tile_starts = np.concatenate(([0], np.cumsum(np.bincount(tile, minlength=self.tiles)))).tolist()
+
+    def end_day(self, day, results):
+        """Applies infections and cures, removes the dead and appends newborns in the order of their parents' ids."""
+        arrays = {name: array[:self.count] for name, array in self.shared[0].arrays.items()}
+        cured, infected = arrays["cured_today"], arrays["infected_today"]
+        arrays["status"][cured] = Status.Recovered.value
+        arrays["immune_days"][cured] = 0
+        arrays["status"][infected] = Status.Infected.value
+        arrays["infected_days"][infected] = 0
+
+        keep = ~arrays["dead"]
+        alive = int(np.count_nonzero(keep))
+        for array in arrays.values(): array[:alive] = array[keep]
+
+        parent_ids = np.concatenate([result["parent_ids"] for result in results])
+        order = np.argsort(parent_ids, kind="stable")
+        child_x = np.concatenate([result["child_x"] for result in results])[order]
+        child_y = np.concatenate([result["child_y"] for result in results])[order]
+        self.ensure_capacity(alive + len(order))
+
+        arrays = self.shared[0].arrays
+        born = slice(alive, alive + len(order))
+        ids = np.arange(self.next_id, self.next_id + len(order), dtype=np.int64)
+        self.next_id += len(order)
+        arrays["ids"][born] = ids
+        arrays["x"][born] = child_x
+        arrays["y"][born] = child_y
+        arrays["status"][born] = Status.Susceptible.value
+        for name in ("infected_days", "immune_days", "days_old"): arrays[name][born] = 0
+        arrays["anti_vaccine"][born] = uniform(self.config, day, Phase.Newborn, ids, 0) < self.config.anti_vaccine_percentage
+        arrays["fearful"][born] = uniform(self.config, day, Phase.Newborn, ids, 1) < self.config.fearful_percentage
+        arrays["dead"][born] = False
+
+        self.count = alive + len(order)
+        self.counters.birth(len(order))
+        self.bind()
+
+    def ensure_capacity(self, count):
+        """Moves the columns to larger shared blocks when count agents do not fit, workers attach to them on the next phase."""
+        old = self.shared[0]
+        if count <= old.capacity: return
+        new = SharedColumns(max(count, 2 * old.capacity))
+        for name in SHARED_COLUMNS: new.arrays[name][:self.count] = old.arrays[name][:self.count]
+        self.shared[0] = new
+        old.release()
@@ -0,0 +1,99 @@
+import contextlib
+import csv
+import pathlib
+import threading
+import time
+
+import simulation
+import streaming
+
+
+
+# --- Constants ---
+
+PROFILE_PATH = simulation.STATS_PATH.parent / "profile.csv"
+PHASES = ["move", "infection", "reproduction", "bookkeeping", "gather_stats", "render"]
+COUNTERS = ["distance_checks", "rng_draws"]
+
+
+
+# --- Profiler ---
+
+class Profiler:
+    """Time spent in every phase of a day and counts of hot path operations, one CSV row per day.
+
+    Populations with a profiler call lap(phase) at the end of each part of their step,
+    charging the time since the previous lap (or mark()) to that phase, and count() for
+    distance checks and random draws. Callers time the rest with phase() and close the
+    row of every day with end_day(). Phases can be timed from another thread (the view
+    renders while a SimulationThread simulates), a lock keeps the rows whole.
+    """
+
+    def __init__(self, path=PROFILE_PATH):
+        self.path = pathlib.Path(path)
+        self.file = streaming.open_text(self.path)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['Day'] + [f"{phase}_seconds" for phase in PHASES] + COUNTERS)
+
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.total_times = dict.fromkeys(PHASES, 0.0)
+        self.total_counts = dict.fromkeys(COUNTERS, 0)
+        self.days = 0
+        self.last = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def mark(self):
+        """Starts timing from now, time since the previous lap is not charged to any phase."""
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        with self.lock: self.times[phase] += now - self.last
+        self.last = now
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock: self.times[phase] += time.perf_counter() - start
+
+    def count(self, counter, n=1):
+        self.counts[counter] += n
+
+    def end_day(self, day):
+        with self.lock: self.write_day(day)
+
+    def write_day(self, day):
+        self.writer.writerow([day] + [f"{self.times[phase]:.6f}" for phase in PHASES] + [self.counts[c] for c in COUNTERS])
+        for phase in PHASES:
+            self.total_times[phase] += self.times[phase]
+            self.times[phase] = 0.0
+        for counter in COUNTERS:
+            self.total_counts[counter] += self.counts[counter]
+            self.counts[counter] = 0
+        self.days += 1
+
+    def summary(self) -> str:
+        """Table of total and per day cost of every phase and counter."""
+        days = max(1, self.days)
+        total = sum(self.total_times.values()) or 1.0
+        lines = [f"{'Phase':<16}{'Total s':>12}{'Per day ms':>14}{'Share':>9}"]
+        for phase in PHASES:
+            seconds = self.total_times[phase]
+            lines.append(f"{phase:<16}{seconds:>12.3f}{seconds / days * 1000:>14.3f}{seconds / total:>9.1%}")
+        lines.append(f"{'Counter':<16}{'Total':>12}{'Per day':>14}")
+        for counter in COUNTERS:
+            lines.append(f"{counter:<16}{self.total_counts[counter]:>12}{self.total_counts[counter] / days:>14.1f}")
+        return "\n".join(lines)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
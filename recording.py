@@ -0,0 +1,214 @@
+import dataclasses
+import json
+import pathlib
+
+import numpy as np
+
+import simulation
+from simulation import Status
+
+
+
+# --- Constants ---
+
+RECORDING_PATH = simulation.STATS_PATH.parent / "recording"
+KEYFRAME_EVERY = 30 # days, a seek decodes at most this many deltas
+POSITION_SCALE = 16 # positions are stored in 1/16 of a pixel
+MAX_DELTA = np.iinfo(np.int16).max # a day with a longer move is stored as a keyframe
+
+
+
+# --- Recording ---
+
+def segment_path(directory, first_day):
+    return pathlib.Path(directory) / f"segment-{first_day:05d}.npz"
+
+
+class Recorder:
+    """Writes agent positions and statuses of every day to a directory, usable as on_day callback.
+
+    Days are grouped in segments of keyframe_every days, every segment is one compressed .npz
+    file starting with a keyframe (all agents) followed by deltas to the previous day: removed
+    agents, moves of the others and newborns. Frames are kept sorted by agent id, ids only
+    grow, so survivors keep their order and newborns always come last.
+    """
+
+    def __init__(self, directory=RECORDING_PATH, config=None, keyframe_every=KEYFRAME_EVERY):
+        self.directory = pathlib.Path(directory)
+        if not self.directory.exists():
+            self.directory.mkdir(parents=True)
+        self.config = config
+        self.keyframe_every = keyframe_every
+        self.first_day = None
+        self.last_day = None
+        self.segment_start = None
+        self.segment = {}
+        self.previous = None # ids, x, y, status of the last recorded day
+
+    def __call__(self, population, day, stats=None):
+        self.record(population, day)
+
+    def record(self, population, day):
+        columns = population.to_columns()
+        ids = np.asarray(columns.get("ids", np.arange(len(columns["x"]))), dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        frame = (
+            ids[order],
+            np.rint(columns["x"][order] * POSITION_SCALE).astype(np.int32),
+            np.rint(columns["y"][order] * POSITION_SCALE).astype(np.int32),
+            columns["status"][order].astype(np.int8)
+        )
+
+        if self.first_day is None: self.first_day = day
+        if (day - self.first_day) % self.keyframe_every == 0: # every segment starts with a keyframe
+            self.flush()
+            self.segment_start = day
+            self.add_keyframe(day, frame)
+        elif not self.add_delta(day, frame):
+            self.add_keyframe(day, frame)
+        self.previous = frame
+        self.last_day = day
+
+    def add_keyframe(self, day, frame):
+        ids, x, y, status = frame
+        self.segment.update({f"{day:05d}_ids": ids, f"{day:05d}_x": x, f"{day:05d}_y": y, f"{day:05d}_status": status})
+
+    def add_delta(self, day, frame):
+        """Stores the frame as changes to the previous one, False if it cannot be stored that way."""
+        ids, x, y, status = frame
+        previous_ids, previous_x, previous_y, _ = self.previous
+        kept = np.isin(previous_ids, ids, assume_unique=True)
+        survivors = np.count_nonzero(kept)
+        if survivors and not np.array_equal(ids[:survivors], previous_ids[kept]): return False
+
+        dx = x[:survivors] - previous_x[kept]
+        dy = y[:survivors] - previous_y[kept]
+        if survivors and max(np.abs(dx).max(), np.abs(dy).max()) > MAX_DELTA: return False
+
+        self.segment.update({
+            f"{day:05d}_removed": np.flatnonzero(~kept).astype(np.int32),
+            f"{day:05d}_dx": dx.astype(np.int16),
+            f"{day:05d}_dy": dy.astype(np.int16),
+            f"{day:05d}_status": status,
+            f"{day:05d}_born_ids": ids[survivors:],
+            f"{day:05d}_born_x": x[survivors:],
+            f"{day:05d}_born_y": y[survivors:],
+        })
+        return True
+
+    def flush(self):
+        """Writes the current segment and the metadata, a recording is playable up to the last flush."""
+        if not self.segment: return
+        np.savez_compressed(segment_path(self.directory, self.segment_start), **self.segment)
+        self.segment = {}
+
+        meta = {
+            "first_day": self.first_day,
+            "last_day": self.last_day,
+            "keyframe_every": self.keyframe_every,
+            "position_scale": POSITION_SCALE,
+            "config": None if self.config is None else dataclasses.asdict(self.config),
+        }
+        with open(self.directory / "meta.json", "w") as file:
+            json.dump(meta, file, indent=4)
+
+    def close(self):
+        self.flush()
+
+
+
+# --- Playback ---
+
+class Frame:
+    """Recorded state of one day, with the parts of the population interface used for drawing."""
+
+    def __init__(self, day, ids, x, y, status):
+        self.day = day
+        self.ids = ids
+        self.x = x
+        self.y = y
+        self.status = status
+        self.lookup = None # CellIndex for find_at, built on first use
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_of(self, agent_id):
+        return int(np.searchsorted(self.ids, agent_id))
+
+    def find_at(self, x, y, radius):
+        return simulation.find_agent_at(self, x, y, radius)
+
+    def get_info_list(self, agent_id) -> list[str]:
+        return simulation.agent_info_list(self, agent_id)
+
+    def gather_stats(self):
+        counts = np.bincount(self.status, minlength=Status.Recovered.value + 1)
+        return tuple(int(counts[status.value]) for status in Status)
+
+
+def snapshot(population, day) -> Frame:
+    """Frame copied from a live population, safe to draw while the population goes on simulating."""
+    columns = population.to_columns()
+    ids = np.asarray(columns.get("ids", np.arange(len(columns["x"]))), dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    return Frame(day, ids[order], columns["x"][order], columns["y"][order], columns["status"][order].astype(np.int8))
+
+
+class Recording:
+    """Reads a directory written by Recorder, frame(day) seeks to any recorded day."""
+
+    def __init__(self, directory=RECORDING_PATH):
+        self.directory = pathlib.Path(directory)
+        with open(self.directory / "meta.json") as file:
+            meta = json.load(file)
+        self.first_day = meta["first_day"]
+        self.last_day = meta["last_day"]
+        self.keyframe_every = meta["keyframe_every"]
+        self.position_scale = meta["position_scale"]
+        self.config = None if meta["config"] is None else simulation.Config(**meta["config"])
+
+        self.segment_start = None
+        self.segment = None
+        self.current = None # day, ids, x, y, status of the last decoded day
+        self.last_frame = None # returned again while the day stays the same, with its lookup index
+
+    def load_segment(self, start):
+        if start == self.segment_start: return
+        with np.load(segment_path(self.directory, start)) as data:
+            self.segment = {name: data[name] for name in data.files}
+        self.segment_start = start
+        self.current = None
+
+    def decode(self, day):
+        """Applies the keyframe or delta of day to the current state."""
+        key = f"{day:05d}_"
+        if key + "ids" in self.segment:
+            self.current = (day, *(self.segment[key + name] for name in ("ids", "x", "y", "status")))
+            return
+
+        _, ids, x, y, _ = self.current
+        kept = np.ones(len(ids), dtype=bool)
+        kept[self.segment[key + "removed"]] = False
+        self.current = (
+            day,
+            np.concatenate((ids[kept], self.segment[key + "born_ids"])),
+            np.concatenate((x[kept] + self.segment[key + "dx"], self.segment[key + "born_x"])),
+            np.concatenate((y[kept] + self.segment[key + "dy"], self.segment[key + "born_y"])),
+            self.segment[key + "status"]
+        )
+
+    def frame(self, day) -> Frame:
+        day = min(max(day, self.first_day), self.last_day)
+        if self.last_frame is not None and self.last_frame.day == day: return self.last_frame
+        start = day - (day - self.first_day) % self.keyframe_every
+        self.load_segment(start)
+
+        # Going forward continues from the current day, otherwise start again from the keyframe
+        if self.current is None or self.current[0] > day: self.decode(start)
+        for d in range(self.current[0] + 1, day + 1):
+            self.decode(d)
+
+        _, ids, x, y, status = self.current
+        self.last_frame = Frame(day, ids, x / self.position_scale, y / self.position_scale, status)
+        return self.last_frame
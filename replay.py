@@ -0,0 +1,115 @@
+import argparse
+import pathlib
+import sys
+
+import pygame
+
+import recording
+import simulator
+from simulation import WIDTH, HEIGHT
+
+
+
+# --- Constants ---
+
+FPS = 60
+DAYS_PER_SECOND = 30 # starting replay speed
+PROGRESS_BAR_HEIGHT = 20
+
+
+
+# --- Drawing ---
+
+def draw_progress_bar(window, recorded, day):
+    bar = pygame.Rect(0, HEIGHT - PROGRESS_BAR_HEIGHT, WIDTH, PROGRESS_BAR_HEIGHT)
+    span = max(1, recorded.last_day - recorded.first_day)
+    pygame.draw.rect(window, simulator.LIGHT_GRAY, bar)
+    pygame.draw.rect(window, simulator.BLACK, (0, bar.y, WIDTH * (day - recorded.first_day) // span, bar.height))
+    return bar
+
+
+def day_at(recorded, bar, x):
+    return recorded.first_day + round(x / bar.width * (recorded.last_day - recorded.first_day))
+
+
+def play(recorded):
+    """Plays the recording in a pygame window.
+
+    Space pauses, left and right arrows step one day (a week with shift), up and down
+    change the speed, clicking the bar at the bottom seeks, clicking an agent selects it.
+    The camera pans and zooms as in the simulation view (simulator.Camera).
+    """
+    pygame.init()
+    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption(simulator.WINDOW_TITLE + " (replay)")
+    clock = pygame.time.Clock()
+
+    day = float(recorded.first_day)
+    days_per_second = DAYS_PER_SECOND
+    paused = False
+    selected_agent = None
+    if recorded.config is None: camera = simulator.Camera(WIDTH, HEIGHT)
+    else: camera = simulator.Camera(recorded.config.world_width, recorded.config.world_height)
+    minimap = None
+    bar = pygame.Rect(0, HEIGHT - PROGRESS_BAR_HEIGHT, WIDTH, PROGRESS_BAR_HEIGHT)
+    running = True
+
+    while running:
+        frame = recorded.frame(int(day))
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif camera.handle(event):
+                pass
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if bar.collidepoint(event.pos): day = float(day_at(recorded, bar, event.pos[0]))
+                elif minimap is not None and minimap.collidepoint(event.pos): camera.center_on(*simulator.minimap_to_world(minimap, camera, event.pos))
+                else: selected_agent = simulator.get_hovered_agent(frame, camera)
+            elif event.type == pygame.KEYDOWN:
+                step = 7 if event.mod & pygame.KMOD_SHIFT else 1
+                if event.key == pygame.K_SPACE: paused = not paused
+                elif event.key == pygame.K_RIGHT: day = float(int(day) + step)
+                elif event.key == pygame.K_LEFT: day = float(int(day) - step)
+                elif event.key == pygame.K_UP: days_per_second *= 2
+                elif event.key == pygame.K_DOWN: days_per_second = max(0.25, days_per_second / 2)
+
+        day = min(max(day, recorded.first_day), recorded.last_day)
+        frame = recorded.frame(int(day))
+
+        window.fill(simulator.WHITE)
+        minimap = simulator.draw_view(window, frame, camera, selected_agent)
+        bar = draw_progress_bar(window, recorded, frame.day)
+
+        state = "paused" if paused else f"{days_per_second:g} days/s"
+        susceptible, infected, recovered = frame.gather_stats()
+        text = simulator.render_text(f"Day {frame.day}/{recorded.last_day} ({state})   S {susceptible}  I {infected}  R {recovered}", 30)
+        window.blit(text, (10, 10))
+
+        hovered_agent = simulator.get_hovered_agent(frame, camera)
+        if hovered_agent is not None:
+            simulator.draw_tooltip(window, frame.get_info_list(hovered_agent))
+
+        pygame.display.flip()
+        clock.tick(FPS)
+        if not paused and day < recorded.last_day: day += days_per_second / FPS
+
+    pygame.quit()
+
+
+
+# --- Main ---
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Plays back a recording made by headless.py --record.")
+    parser.add_argument("directory", nargs="?", type=pathlib.Path, default=recording.RECORDING_PATH)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    play(recording.Recording(args.directory))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
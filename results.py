@@ -0,0 +1,188 @@
+import argparse
+import dataclasses
+import hashlib
+import json
+import pathlib
+import sqlite3
+import sys
+import time
+import zlib
+
+import numpy as np
+
+import simulation
+import streaming
+
+
+
+# --- Constants ---
+
+RESULTS_PATH = simulation.STATS_PATH.parent / "results.sqlite"
+# Config fields that change how a run is shown or saved, not its stats, left out of the key
+OUTPUT_FIELDS = ("fps", "show_view", "gather_stats", "checkpoint_every", "log_events", "render_every", "simulate_in_thread", "profile")
+SQL_TYPES = {int: "INTEGER", int | None: "INTEGER", float: "REAL", bool: "INTEGER"} # list fields are stored as JSON text
+
+
+
+# --- Keys ---
+
+def run_params(config) -> dict:
+    """Every Config field that affects the stats of a run, the seed included."""
+    return {name: value for name, value in dataclasses.asdict(config).items() if name not in OUTPUT_FIELDS}
+
+
+def config_key(config) -> str:
+    """SHA-256 of the model version and run parameters, equal configs (same seed) give equal stats under one model."""
+    text = json.dumps({"model_version": simulation.MODEL_VERSION, **run_params(config)}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def stored_fields():
+    return [field for field in dataclasses.fields(simulation.Config) if field.name not in OUTPUT_FIELDS]
+
+
+
+# --- Store ---
+
+class ResultStore:
+    """Stats of finished runs in an SQLite file, keyed by config_key.
+
+    Every run parameter is a column of the runs table with its own index, so runs can be
+    looked up by parameter ranges with query(). Stats rows are kept as one compressed
+    int64 block per run. Runs of another simulation.MODEL_VERSION are never found again,
+    prune() deletes them.
+    """
+
+    def __init__(self, path=RESULTS_PATH):
+        self.path = pathlib.Path(path)
+        if not self.path.parent.exists():
+            self.path.parent.mkdir(parents=True)
+        self.connection = sqlite3.connect(self.path)
+        self.create_tables()
+
+    def create_tables(self):
+        fields = stored_fields()
+        columns = ", ".join(f"{field.name} {SQL_TYPES.get(field.type, 'TEXT')}" for field in fields)
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, created REAL, model_version INTEGER, days INTEGER, stats_columns TEXT, stats BLOB, {columns})"
+            )
+            existing = {row[1] for row in self.connection.execute("PRAGMA table_info(runs)")}
+            if "model_version" not in existing: # files made before versions, their runs are stale
+                self.connection.execute("ALTER TABLE runs ADD COLUMN model_version INTEGER")
+            for field in fields:
+                if field.name not in existing: # fields added to Config since the file was made
+                    self.connection.execute(f"ALTER TABLE runs ADD COLUMN {field.name} {SQL_TYPES.get(field.type, 'TEXT')}")
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS runs_{field.name} ON runs ({field.name})")
+
+    def get(self, config):
+        """Stats rows (without the Day column) of a run with the same parameters, None if there is none."""
+        row = self.connection.execute("SELECT days, stats_columns, stats FROM runs WHERE key = ?", (config_key(config),)).fetchone()
+        if row is None: return None
+        days, columns, blob = row
+        if json.loads(columns) != simulation.STATS_COLUMNS: return None # stored before the columns changed
+        return np.frombuffer(zlib.decompress(blob), dtype=np.int64).reshape(days, -1).tolist()
+
+    def put(self, config, stats):
+        rows = np.asarray([list(row) for row in stats], dtype=np.int64)
+        params = run_params(config)
+        values = [value if not isinstance(value, list) else json.dumps(value) for value in params.values()]
+        names = ", ".join(params)
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO runs (key, created, model_version, days, stats_columns, stats, {names}) "
+                f"VALUES ({', '.join('?' * (6 + len(params)))})",
+                [config_key(config), time.time(), simulation.MODEL_VERSION, len(rows), json.dumps(simulation.STATS_COLUMNS), zlib.compress(rows.tobytes())]
+                + values
+            )
+
+    def query(self, **ranges) -> list[tuple[str, dict]]:
+        """(key, run parameters) of stored runs of the current model, a range is a (low, high) pair (None for open) or one exact value."""
+        conditions, values = ["model_version = ?"], [simulation.MODEL_VERSION]
+        for name, value in ranges.items():
+            if name not in {field.name for field in stored_fields()}: raise ValueError(f"Unknown parameter: {name}")
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    conditions.append(f"{name} >= ?")
+                    values.append(low)
+                if high is not None:
+                    conditions.append(f"{name} <= ?")
+                    values.append(high)
+            else:
+                conditions.append(f"{name} = ?")
+                values.append(value)
+
+        names = [field.name for field in stored_fields()]
+        where = " AND ".join(conditions)
+        cursor = self.connection.execute(f"SELECT key, {', '.join(names)} FROM runs WHERE {where} ORDER BY created", values)
+        return [(row[0], dict(zip(names, row[1:]))) for row in cursor]
+
+    def rows(self, key):
+        """Stats rows of the run with the given key, which can be shortened."""
+        found = self.connection.execute("SELECT days, stats FROM runs WHERE key LIKE ?", (key + "%",)).fetchall()
+        if len(found) != 1: raise KeyError(f"{len(found)} runs match {key}")
+        days, blob = found[0]
+        return np.frombuffer(zlib.decompress(blob), dtype=np.int64).reshape(days, -1).tolist()
+
+    def prune(self) -> int:
+        """Deletes the runs of other model versions, returns how many there were."""
+        with self.connection:
+            cursor = self.connection.execute("DELETE FROM runs WHERE model_version IS NOT ?", (simulation.MODEL_VERSION,))
+        self.connection.execute("VACUUM")
+        return cursor.rowcount
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+
+# --- Main ---
+
+def parse_range(spec):
+    """(name, range) from "name=low:high" (either side can be empty) or "name=value"."""
+    name, _, value = spec.partition("=")
+    name = name.strip().lower().replace("-", "_")
+    if ":" not in value: return name, float(value)
+    low, _, high = value.partition(":")
+    return name, (float(low) if low.strip() else None, float(high) if high.strip() else None)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Lists runs in the results store, exports their stats for make-plots.py and deletes stale runs.")
+    parser.add_argument("--store", type=pathlib.Path, default=RESULTS_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    listing = commands.add_parser("list", help="runs matching all the given parameter ranges")
+    listing.add_argument("where", nargs="*", metavar="NAME=LOW:HIGH", help="parameter range, NAME=VALUE for one value")
+    listing.add_argument("--show", nargs="*", default=["seed"], metavar="NAME", help="parameters printed next to the keys")
+    export = commands.add_parser("export", help="writes the stats of a run as a stats CSV file")
+    export.add_argument("key", help="key of the run, a unique prefix is enough")
+    export.add_argument("--output", type=pathlib.Path, help="stats file, <output dir of stats>/<key>.csv by default")
+    commands.add_parser("prune", help=f"deletes the runs of other model versions than {simulation.MODEL_VERSION}")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with ResultStore(args.store) as store:
+        if args.command == "list":
+            runs = store.query(**dict(parse_range(spec) for spec in args.where))
+            for key, params in runs:
+                print(key[:12], "  ".join(f"{name}={params[name]}" for name in args.show))
+            print(f"{len(runs)} runs")
+        elif args.command == "prune":
+            print(f"{store.prune()} runs of other model versions deleted")
+        else:
+            output = args.output or simulation.STATS_PATH.parent / f"{args.key}.csv"
+            with streaming.StatsWriter(output, store.rows(args.key)): pass
+            print(f"Stats saved to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import enum
+import random
+
+import numpy as np
+
+
+
+# --- Phases ---
+
+class Phase(enum.IntEnum):
+    """Part of a day with its own random stream, so adding draws to one phase does not shift the others."""
+    Init = 0
+    Move = 1
+    Death = 2
+    Vaccination = 3
+    Infection = 4
+    Cure = 5
+    Reproduction = 6
+    Newborn = 7
+
+
+
+# --- Streams ---
+
+def new_seed() -> int:
+    """Fresh seed from OS entropy, for runs that were not given one."""
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+
+def stream_key(seed, day, phase) -> int:
+    """64 bit key of the (seed, day, phase) stream."""
+    return int(np.random.SeedSequence([seed, day, int(phase)]).generate_state(1, np.uint64)[0])
+
+
+def phase_random(seed, day, phase) -> random.Random:
+    """Sequential stream for the reference engine, same (seed, day, phase) gives the same numbers."""
+    return random.Random(stream_key(seed, day, phase))
+
+
+class CountingRandom(random.Random):
+    """random.Random counting its draws (uniform() draws through random() too), for profiling."""
+
+    def __init__(self, seed):
+        super().__init__(seed)
+        self.draws = 0
+
+    def random(self):
+        self.draws += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        # Defined so randint() keeps using getrandbits, overriding only random() would switch it to random()
+        return super().getrandbits(k)
+
+
+class DayStreams:
+    """Sequential streams of all phases of one day, e.g. streams.infection.random().
+
+    With counting, streams are CountingRandom and draws() tells how many numbers were used.
+    """
+
+    def __init__(self, seed, day, counting=False):
+        for phase in Phase:
+            if counting: stream = CountingRandom(stream_key(seed, day, phase))
+            else: stream = phase_random(seed, day, phase)
+            setattr(self, phase.name.lower(), stream)
+
+    def draws(self) -> int:
+        return sum(getattr(self, phase.name.lower()).draws for phase in Phase)
+
+
+def mix(z) -> np.ndarray:
+    """SplitMix64 finalizer, uint64 numbers to well spread uint64 hashes."""
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def agent_uniform(seed, day, phase, ids, draw=0) -> np.ndarray:
+    """Uniform [0, 1) numbers for the given agent ids, counter-based.
+
+    Every number is a SplitMix64 hash of (seed, day, phase, agent id, draw), so it does not
+    depend on how agents are ordered, chunked or split between processes. draw tells apart
+    several numbers needed by one agent in the same phase.
+    """
+    ids = np.asarray(ids, dtype=np.uint64)
+    key = np.uint64((stream_key(seed, day, phase) + draw * 0xD1B54A32D192ED03) % 2 ** 64)
+
+    z = mix(key + ids * np.uint64(0x9E3779B97F4A7C15))
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
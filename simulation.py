@@ -0,0 +1,1526 @@
+import numpy as np
+import collections
+import dataclasses
+import enum
+import csv
+import math
+import pathlib
+
+from rng import DayStreams, Phase, agent_uniform, mix, new_seed, phase_random
+
+
+
+# --- Constants ---
+
+WIDTH, HEIGHT = 1200, 1000 # of the window
+STATS_PATH = pathlib.Path("./stats/total-counts.csv")
+STATS_COLUMNS = [
+    'Day', 'Susceptible', 'Infected', 'Recovered', # compartments at the end of the day
+    'Vaccined', 'Infections', 'Cures', 'ImmunityLosses', 'Births', 'Deaths', 'DiseaseDeaths' # changes during the day
+]
+MODEL_VERSION = 1 # of the simulation rules, bump it when a change gives other stats for the same Config (stored runs go stale)
+
+
+
+# --- Parameters --- (defaults of Config, user modifiable)
+
+# Simulation
+FPS = 60 # of the view, 0 draws as fast as possible
+WORLD_WIDTH, WORLD_HEIGHT = WIDTH, HEIGHT # world size, the view starts showing it whole
+NUM_AGENTS = 500  
+MAX_DAYS = 365 * 2 
+GATHER_STATS = True
+SHOW_VIEW = True
+USE_VECTORIZED_ENGINE = False
+SEED = None # of random streams, None draws a new one for every run
+CHECKPOINT_EVERY = 0 # days between saving the whole state, 0 never saves
+LOG_EVENTS = False # of every agent to a file next to the stats
+RENDER_EVERY = 1 # simulated days between drawn frames
+SIMULATE_IN_THREAD = False # the view draws snapshots of a simulation running in a worker thread
+PROFILE = False # time the phases of every day, written to a file next to the stats
+USE_EVENT_CALENDAR = False # vectorized engine plans deaths, cures and immunity ends instead of daily checks
+WORKERS = 0 # processes sharing one simulation split into tiles of the world (vectorized rules), 0 or 1 for none
+STOP_AFTER_QUIET_DAYS = 0 # days in a row without infected agents after which the run ends, 0 runs to max_days
+STATIONARY_DAYS = 0 # days of compartment counts within STATIONARY_TOLERANCE after which the run ends, 0 never
+STATIONARY_TOLERANCE = 0.001 # of the population, largest change of a compartment over STATIONARY_DAYS
+FAST_FORWARD = False # a run ended without infected agents fills the days up to max_days from expected counts
+USE_NEIGHBOR_LISTS = False # reference engine checks contacts among lists of near agents, rebuilt only when needed
+NEIGHBOR_SKIN = 1.0 # margin of neighbor lists, in days of movement at max_speed (1 is the least, lists then last a few days)
+MEAN_FIELD_INFECTION = False # vectorized engine infects from infected counts of nearby cells instead of pairs (approximate)
+SINGLE_DRAW_INFECTION = False # reference engine decides infection of a susceptible agent with one draw a day
+
+# Agents parameters
+NO_MOVE_PROBABILITY = 0.3
+MAX_SPEED = 10 # of agents (max distance per day)
+DAY_IN_WEEK_MODIFIER = [0.2, 0.5, 0.8, 0.4, 0.3, 1, 0.9] # of max speed through the week
+VACCINED_PERCENTAGE = 0.01 # of modifing agents status every day
+MASKED_PERCENTAGE = 0.02 # of agents every day
+FEARFUL_PERCENTAGE = 0.2 # of new agents after creating
+ANTI_VACCINE_PERCENTAGE = 0.1 # of new agents after creating
+MIN_DAYS_TO_LIVE = 100 # normal live
+NORMAL_DEATH_PROBABILITY = 0.01 # after min_days_to_live
+REPRODUCTION_PROBABILITY = 0.00129 # every day
+REPRODUCTION_RADIUS = 30
+
+# Disease
+INFECTION_RADIUS = 50  
+INFECTION_PROBABILITY = 0.1
+INFECTED_ON_START = 0.2 
+MIN_INFECTED_DAYS = 30
+CURE_PROBABILITY = 0.01 # after min_infected_days
+IMMUNITY_DAYS = 90 
+DISEASE_DEATH_PROBABILITY = 0.01 # every day
+
+
+
+# --- Configuration ---
+
+@dataclasses.dataclass
+class Config:
+    """Parameters of a single run, defaults are the parameters above."""
+
+    # Simulation
+    fps: int = FPS
+    world_width: int = WORLD_WIDTH
+    world_height: int = WORLD_HEIGHT
+    num_agents: int = NUM_AGENTS
+    max_days: int = MAX_DAYS
+    gather_stats: bool = GATHER_STATS
+    show_view: bool = SHOW_VIEW
+    use_vectorized_engine: bool = USE_VECTORIZED_ENGINE
+    seed: int | None = SEED
+    checkpoint_every: int = CHECKPOINT_EVERY
+    log_events: bool = LOG_EVENTS
+    render_every: int = RENDER_EVERY
+    simulate_in_thread: bool = SIMULATE_IN_THREAD
+    profile: bool = PROFILE
+    use_event_calendar: bool = USE_EVENT_CALENDAR
+    workers: int = WORKERS
+    stop_after_quiet_days: int = STOP_AFTER_QUIET_DAYS
+    stationary_days: int = STATIONARY_DAYS
+    stationary_tolerance: float = STATIONARY_TOLERANCE
+    fast_forward: bool = FAST_FORWARD
+    use_neighbor_lists: bool = USE_NEIGHBOR_LISTS # agents out of range take no infection draws, trajectories differ from the grid's but are statistically equivalent
+    neighbor_skin: float = NEIGHBOR_SKIN
+    mean_field_infection: bool = MEAN_FIELD_INFECTION
+    single_draw_infection: bool = SINGLE_DRAW_INFECTION
+
+    # Agents parameters
+    no_move_probability: float = NO_MOVE_PROBABILITY
+    max_speed: int = MAX_SPEED
+    day_in_week_modifier: list[float] = dataclasses.field(default_factory=lambda: list(DAY_IN_WEEK_MODIFIER))
+    vaccined_percentage: float = VACCINED_PERCENTAGE
+    masked_percentage: float = MASKED_PERCENTAGE
+    fearful_percentage: float = FEARFUL_PERCENTAGE
+    anti_vaccine_percentage: float = ANTI_VACCINE_PERCENTAGE
+    min_days_to_live: int = MIN_DAYS_TO_LIVE
+    normal_death_probability: float = NORMAL_DEATH_PROBABILITY
+    reproduction_probability: float = REPRODUCTION_PROBABILITY
+    reproduction_radius: int = REPRODUCTION_RADIUS
+
+    # Disease
+    infection_radius: int = INFECTION_RADIUS
+    infection_probability: float = INFECTION_PROBABILITY
+    infected_on_start: float = INFECTED_ON_START
+    min_infected_days: int = MIN_INFECTED_DAYS
+    cure_probability: float = CURE_PROBABILITY
+    immunity_days: int = IMMUNITY_DAYS
+    disease_death_probability: float = DISEASE_DEATH_PROBABILITY
+
+
+
+# --- Agent ---
+
+class Status(enum.Enum):
+    Susceptible = 1
+    Infected = 2
+    Recovered = 3
+
+
+class Event(enum.IntEnum):
+    """Change of a single agent, as written to the event log."""
+    Infection = 1
+    Birth = 2
+    Death = 3
+    DiseaseDeath = 4
+    Vaccination = 5
+    Cure = 6
+
+
+class Agent:
+    def __init__(self, x, y, status, config, rng):
+        self.config = config
+        self.id = -1 # given by the population
+        self.slot = -1 # position in the AgentPool, -1 when not in one
+        self.x = x
+        self.y = y
+        self.status = status
+        self.velocity = [rng.uniform(-config.max_speed, config.max_speed), rng.uniform(-config.max_speed, config.max_speed)]
+        self.infected_days = 0
+        self.immune_days = 0
+        self.anti_vaccine = False
+        self.fearful = False
+        self.days_old = 0
+
+    def get_info_list(self) -> list[str]:
+        return [
+            f"Coords: ({self.x:.2f}, {self.y:.2f})",
+            f"Status: {self.status.name}",
+            f"Days old: {self.days_old}",
+            f"Infected days: {self.infected_days}",
+            f"Immune days: {self.immune_days}",
+            f"Anti vaccine: {self.anti_vaccine}",
+            f"Fearful: {self.fearful}"
+        ]
+
+    def move(self, max_speed, rng):
+        if rng.random() < self.config.no_move_probability: return
+
+        if self.fearful: speed = max_speed / 2
+        else: speed = max_speed
+
+        self.velocity = [rng.uniform(-speed, speed), rng.uniform(-speed, speed)]
+        self.x += self.velocity[0]
+        self.y += self.velocity[1]
+
+        width, height = self.config.world_width, self.config.world_height
+        if self.x <= 0 or self.x >= width: 
+            self.velocity[0] = -self.velocity[0]
+            if self.x < 0: self.x = 0
+            elif self.x > width: self.x = width
+
+        if self.y <= 0 or self.y >= height: 
+            self.velocity[1] = -self.velocity[1]
+            if self.y < 0: self.y = 0
+            elif self.y > height: self.y = height
+
+
+    def distance_squared(self, other):
+        return ((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
+
+
+    def simulate_day(self, others, counters, streams, grid=None, events=None, profiler=None, far_draws=True):
+        # far_draws: susceptible agents out of infection radius still take the mask draw, as before neighbor lists
+        config = self.config
+        # Check if its time to die
+        self.days_old += 1
+        if self.days_old >= config.min_days_to_live:
+            if streams.death.random() < config.normal_death_probability:
+                counters.death(self.status.value)
+                if events is not None: events.record(Event.Death, self.id)
+                if profiler is not None: profiler.lap("bookkeeping")
+                return "DEAD"
+
+        # Check if agent is vaccinated
+        if self.anti_vaccine == False and self.status == Status.Susceptible:
+            if streams.vaccination.random() < config.vaccined_percentage:
+                self.status = Status.Recovered
+                self.immune_days = 0
+                counters.vaccinate()
+                if events is not None: events.record(Event.Vaccination, self.id)
+
+        # Check if agent has still immunity
+        elif self.status == Status.Recovered:
+            self.immune_days += 1
+            if self.immune_days >= config.immunity_days:
+                self.status = Status.Susceptible
+                counters.lose_immunity()
+
+        if self.status == Status.Infected:
+            # Check if agent is dead due to disease
+            if streams.death.random() < config.disease_death_probability:
+                counters.disease_death()
+                if events is not None: events.record(Event.DiseaseDeath, self.id)
+                if profiler is not None: profiler.lap("bookkeeping")
+                return "DEAD"
+            if profiler is not None: profiler.lap("bookkeeping")
+            
+            # Try to infect others, with single draw infection the population does it once every agent moved
+            if not config.single_draw_infection:
+                for other in (others if grid is None else grid.around(self, config.infection_radius)):
+                    if other.status == Status.Susceptible:
+                        if profiler is not None: profiler.count("distance_checks")
+                        distance = self.distance_squared(other)
+                        if not far_draws and distance >= config.infection_radius ** 2: continue
+                        if (
+                            (streams.infection.random() < config.masked_percentage and distance < (config.infection_radius / 2) ** 2)
+                            or distance < config.infection_radius ** 2
+                        ):
+                            if streams.infection.random() < config.infection_probability:
+                                other.status = Status.Infected
+                                other.infected_days = 0
+                                counters.infect()
+                                if events is not None: events.record(Event.Infection, other.id, self.id)
+            if profiler is not None: profiler.lap("infection")
+
+            # Check if agent is cured
+            self.infected_days += 1
+            if self.infected_days >= config.min_infected_days:
+                if streams.cure.random() < config.cure_probability:
+                    self.status = Status.Recovered
+                    self.immune_days = 0
+                    counters.cure()
+                    if events is not None: events.record(Event.Cure, self.id)
+        if profiler is not None: profiler.lap("bookkeeping")
+
+        # Try to reproduce
+        for other in (others if grid is None else grid.around(self, config.reproduction_radius)):
+            if profiler is not None: profiler.count("distance_checks")
+            if self.distance_squared(other) < config.reproduction_radius ** 2 and streams.reproduction.random() < config.reproduction_probability:
+                x = (self.x + other.x) / 2
+                y = (self.y + other.y) / 2
+                new_agent = Agent(x, y, Status.Susceptible, self.config, streams.newborn)
+                if streams.newborn.random() < config.anti_vaccine_percentage: new_agent.anti_vaccine = True
+                if streams.newborn.random() < config.fearful_percentage: new_agent.fearful = True
+                if profiler is not None: profiler.lap("reproduction")
+                return new_agent
+        if profiler is not None: profiler.lap("reproduction")
+
+
+
+# --- Counters ---
+
+class Counters:
+    """Agents in every status and changes of the current day, updated by populations on every transition.
+
+    Daily stats are read from here instead of counting the whole population, row() is
+    the stats row of the day without the Day column (see STATS_COLUMNS).
+    """
+
+    DAILY = ("vaccined", "infections", "cures", "immunity_losses", "births", "deaths", "disease_deaths")
+
+    def __init__(self, susceptible=0, infected=0, recovered=0):
+        self.statuses = [0, susceptible, infected, recovered] # indexed by Status value
+        self.start_day()
+
+    def start_day(self):
+        for name in self.DAILY: setattr(self, name, 0)
+
+    def vaccinate(self, n=1):
+        self.statuses[Status.Susceptible.value] -= n
+        self.statuses[Status.Recovered.value] += n
+        self.vaccined += n
+
+    def infect(self, n=1):
+        self.statuses[Status.Susceptible.value] -= n
+        self.statuses[Status.Infected.value] += n
+        self.infections += n
+
+    def cure(self, n=1):
+        self.statuses[Status.Infected.value] -= n
+        self.statuses[Status.Recovered.value] += n
+        self.cures += n
+
+    def lose_immunity(self, n=1):
+        self.statuses[Status.Recovered.value] -= n
+        self.statuses[Status.Susceptible.value] += n
+        self.immunity_losses += n
+
+    def birth(self, n=1):
+        self.statuses[Status.Susceptible.value] += n
+        self.births += n
+
+    def death(self, status_value, n=1):
+        """Natural death of n agents with the given status."""
+        self.statuses[status_value] -= n
+        self.deaths += n
+
+    def disease_death(self, n=1):
+        self.statuses[Status.Infected.value] -= n
+        self.disease_deaths += n
+
+    def compartments(self):
+        return tuple(self.statuses[status.value] for status in Status)
+
+    def row(self) -> list[int]:
+        return list(self.compartments()) + [getattr(self, name) for name in self.DAILY]
+
+
+
+# --- Spatial index ---
+
+class SpatialGrid:
+    """Uniform grid over the world, agents bucketed by cell for nearby agents lookups."""
+
+    def __init__(self, cell_size):
+        self.cell_size = max(1, cell_size)
+        self.cells = {} # (column, row) -> {agent: None}, dict keeps insertion order and O(1) removal
+        self.agent_cells = {}
+
+    def cell_of(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, agent):
+        cell = self.cell_of(agent.x, agent.y)
+        self.cells.setdefault(cell, {})[agent] = None
+        self.agent_cells[agent] = cell
+
+    def remove(self, agent):
+        cell = self.agent_cells.pop(agent)
+        del self.cells[cell][agent]
+        if not self.cells[cell]: del self.cells[cell]
+
+    def update(self, agent):
+        """Moves agent to its new cell, must be called after every agent.move()."""
+        if self.cell_of(agent.x, agent.y) != self.agent_cells[agent]:
+            self.remove(agent)
+            self.insert(agent)
+
+    def nearby(self, x, y, radius):
+        """Agents from all cells overlapping the square around (x, y), distance has to be checked by caller."""
+        column, row = self.cell_of(x, y)
+        reach = int(math.ceil(radius / self.cell_size))
+        for c in range(column - reach, column + reach + 1):
+            for r in range(row - reach, row + reach + 1):
+                cell = self.cells.get((c, r))
+                if cell is not None: yield from cell
+
+    def around(self, agent, radius):
+        return self.nearby(agent.x, agent.y, radius)
+
+    def in_rect(self, left, top, right, bottom):
+        """Agents from all cells overlapping the rectangle, position has to be checked by caller."""
+        first_column, first_row = self.cell_of(left, top)
+        last_column, last_row = self.cell_of(right, bottom)
+        if (last_column - first_column + 1) * (last_row - first_row + 1) > len(self.cells): # fewer cells are occupied
+            for (column, row), cell in self.cells.items():
+                if first_column <= column <= last_column and first_row <= row <= last_row: yield from cell
+            return
+        for c in range(first_column, last_column + 1):
+            for r in range(first_row, last_row + 1):
+                cell = self.cells.get((c, r))
+                if cell is not None: yield from cell
+
+
+class NeighborLists:
+    """Verlet lists: for every agent and contact radius, the agents closer than radius + skin when the lists were built.
+
+    Agents move at most max_speed along each axis per day, so a pair comes at most
+    2 * sqrt(2) * max_speed closer per day. Lists are reused until that bound, summed
+    over the days since they were built, could exceed the skin.
+
+    around() gives the list of the asked radius in id order, distance has to be checked by
+    caller. The population simulates days without far draws, only agents in range take
+    draws, so which agents a day sees does not depend on when the lists were built (or
+    rebuilt after a resume).
+    """
+
+    def __init__(self, radii, skin):
+        self.radii = sorted(set(radii))
+        self.skin = skin
+        self.lists = {radius: {} for radius in self.radii} # radius -> agent -> near agents in id order, the agent itself included
+        self.approach = math.inf # most any pair can have come closer since the lists were built
+        self.checks = 0 # distance checks since last read, for profiling
+        self.rebuilds = 0
+
+    def start_day(self, grid, agents, max_speed):
+        """Rebuilds the lists when they may miss a pair by the end of the day."""
+        step = 2 * math.sqrt(2) * max_speed
+        if self.approach + step > self.skin:
+            self.build(agents)
+            self.approach = 0
+            self.rebuilds += 1
+        self.approach += step
+
+    def build(self, agents):
+        """Finds all pairs at once in a CellIndex, agents are taken in id order so the lists come out sorted."""
+        agents = sorted(agents, key=lambda agent: agent.id)
+        x = np.array([agent.x for agent in agents], dtype=np.float64)
+        y = np.array([agent.y for agent in agents], dtype=np.float64)
+        reach = self.radii[-1] + self.skin
+        index = CellIndex(x, y, reach)
+        found = {radius: ([], []) for radius in self.radii}
+        for queries, points in index.candidate_pairs(x, y, reach):
+            self.checks += len(queries)
+            distances = (x[queries] - x[points]) ** 2 + (y[queries] - y[points]) ** 2
+            for radius in self.radii:
+                close = distances < (radius + self.skin) ** 2
+                found[radius][0].append(queries[close])
+                found[radius][1].append(points[close])
+
+        objects = np.empty(len(agents), dtype=object)
+        objects[:] = agents
+        for radius, (queries, points) in found.items():
+            queries, points = np.concatenate(queries), np.concatenate(points)
+            order = np.lexsort((points, queries))
+            bounds = np.searchsorted(queries[order], np.arange(len(agents) + 1))
+            near = objects[points[order]].tolist()
+            self.lists[radius] = {agent: near[bounds[i]:bounds[i + 1]] for i, agent in enumerate(agents)}
+
+    def add(self, grid, agent):
+        """Adds an agent already in the grid, it has the highest id so lists stay in id order."""
+        reach = self.radii[-1] + self.skin
+        near = sorted((other for other in grid.around(agent, reach) if agent.distance_squared(other) < reach ** 2), key=lambda other: other.id)
+        for radius in self.radii:
+            lists = self.lists[radius]
+            lists[agent] = [other for other in near if agent.distance_squared(other) < (radius + self.skin) ** 2]
+            for other in lists[agent]:
+                if other is not agent: lists[other].append(agent)
+
+    def remove(self, agent):
+        for lists in self.lists.values():
+            for other in lists.pop(agent):
+                if other is not agent: lists[other].remove(agent)
+
+    def around(self, agent, radius):
+        return self.lists[radius][agent]
+
+
+class CellIndex:
+    """Read only array counterpart of SpatialGrid, points sorted by cell for batched radius queries.
+
+    Cells cover the area from (0, 0) to the farthest point, so the index fits any world size.
+    """
+
+    def __init__(self, x, y, cell_size):
+        self.cell_size = max(1, cell_size)
+        self.columns = int(np.max(x, initial=0) // self.cell_size) + 1
+        self.rows = int(np.max(y, initial=0) // self.cell_size) + 1
+
+        cells = self.cell_of(x, y)
+        self.order = np.argsort(cells, kind="stable")
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.columns * self.rows + 1))
+
+    def cell_of(self, x, y):
+        column = np.clip((x // self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip((y // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return row * self.columns + column
+
+    def candidate_pairs(self, x, y, radius):
+        """Yields (query indices, point indices) of every query-point pair from neighbouring cells.
+
+        Pairs are produced one cell offset at a time and split into chunks of at most
+        PAIR_CHUNK_SIZE, distance has to be checked by caller.
+        """
+        reach = int(math.ceil(radius / self.cell_size))
+        column = np.clip((x // self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip((y // self.cell_size).astype(np.int64), 0, self.rows - 1)
+
+        for dc in range(-reach, reach + 1):
+            for dr in range(-reach, reach + 1):
+                c, r = column + dc, row + dr
+                queries = np.flatnonzero((c >= 0) & (c < self.columns) & (r >= 0) & (r < self.rows))
+                cells = r[queries] * self.columns + c[queries]
+                first = self.starts[cells]
+                counts = self.starts[cells + 1] - first
+
+                queries, first, counts = queries[counts > 0], first[counts > 0], counts[counts > 0]
+                bounds = np.searchsorted(np.cumsum(counts), np.arange(0, counts.sum(), PAIR_CHUNK_SIZE), side="right")
+                for lo, hi in zip(bounds, np.append(bounds[1:], len(counts))):
+                    chunk_counts = counts[lo:hi]
+                    group_starts = np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+                    positions = np.repeat(first[lo:hi], chunk_counts) + np.arange(chunk_counts.sum()) - group_starts
+                    yield np.repeat(queries[lo:hi], chunk_counts), self.order[positions]
+
+    def nearby(self, x, y, radius):
+        """Indices of points from all cells overlapping the square around (x, y), distance has to be checked by caller."""
+        reach = int(math.ceil(radius / self.cell_size))
+        column = min(max(int(x // self.cell_size), 0), self.columns - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        first_column, last_column = max(column - reach, 0), min(column + reach, self.columns - 1)
+
+        # Cells of one row are next to each other in the sorted order
+        found = [
+            self.order[self.starts[r * self.columns + first_column] : self.starts[r * self.columns + last_column + 1]]
+            for r in range(max(row - reach, 0), min(row + reach, self.rows - 1) + 1)
+        ]
+        return np.concatenate(found)
+
+    def in_rect(self, left, top, right, bottom):
+        """Indices of points from all cells overlapping the rectangle, position has to be checked by caller."""
+        first_column = min(max(int(left // self.cell_size), 0), self.columns - 1)
+        last_column = min(max(int(right // self.cell_size), 0), self.columns - 1)
+        first_row = min(max(int(top // self.cell_size), 0), self.rows - 1)
+        last_row = min(max(int(bottom // self.cell_size), 0), self.rows - 1)
+        found = [
+            self.order[self.starts[r * self.columns + first_column] : self.starts[r * self.columns + last_column + 1]]
+            for r in range(first_row, last_row + 1)
+        ]
+        return np.concatenate(found)
+
+
+def find_in_index(index, points_x, points_y, x, y, radius):
+    """Lowest index of a point closer than radius to (x, y), None if there is no such point."""
+    candidates = index.nearby(x, y, radius)
+    hits = candidates[(points_x[candidates] - x) ** 2 + (points_y[candidates] - y) ** 2 <= radius ** 2]
+    if len(hits) == 0: return None
+    return int(hits.min())
+
+
+def find_agent_at(population, x, y, radius):
+    """Id of an agent closer than radius to the given point, None if there is no such agent.
+
+    For agents kept as columns, the vectorized engine or a recording.Frame. The CellIndex of
+    positions is kept in population.lookup, which is set to None whenever agents change.
+    """
+    if population.lookup is None: population.lookup = CellIndex(population.x, population.y, LOOKUP_CELL_SIZE)
+    index = find_in_index(population.lookup, population.x, population.y, x, y, radius)
+    return None if index is None else int(population.ids[index])
+
+
+def agent_info_list(population, agent_id) -> list[str]:
+    """Tooltip lines of an agent kept as columns, with every column of AGENT_COLUMNS the population has."""
+    index = population.index_of(agent_id)
+    info = [
+        f"Id: {agent_id}",
+        f"Coords: ({population.x[index]:.2f}, {population.y[index]:.2f})",
+        f"Status: {Status(population.status[index]).name}",
+    ]
+    for label, name in (("Days old", "days_old"), ("Infected days", "infected_days"), ("Immune days", "immune_days"),
+                        ("Anti vaccine", "anti_vaccine"), ("Fearful", "fearful")):
+        if hasattr(population, name): info.append(f"{label}: {getattr(population, name)[index]}")
+    return info
+
+
+
+# --- Agent population ---
+
+# State of every agent as arrays, used by checkpoints and to move agents between engines
+AGENT_COLUMNS = {
+    "x": np.float64,
+    "y": np.float64,
+    "status": np.int8, # Status value
+    "infected_days": np.int32,
+    "immune_days": np.int32,
+    "days_old": np.int32,
+    "anti_vaccine": np.bool_,
+    "fearful": np.bool_,
+}
+
+
+class AgentPool:
+    """Agents in a list with O(1) add and remove, a removed agent's slot is taken by the last agent.
+
+    Removing changes the order of the remaining agents, agents are identified by their ids.
+    """
+
+    def __init__(self, agents=()):
+        self.agents = []
+        for agent in agents: self.add(agent)
+
+    def add(self, agent):
+        agent.slot = len(self.agents)
+        self.agents.append(agent)
+
+    def remove(self, agent):
+        last = self.agents.pop()
+        if last is not agent:
+            self.agents[agent.slot] = last
+            last.slot = agent.slot
+        agent.slot = -1
+
+    def __len__(self):
+        return len(self.agents)
+
+    def __iter__(self):
+        return iter(self.agents)
+
+    def __getitem__(self, slot):
+        return self.agents[slot]
+
+
+class AgentPopulation:
+    """Reference engine, Agent objects simulated one after another.
+
+    A dead agent leaves the grid at once and the pool at the end of the day, newborns
+    join both at the end of the day, so they are first simulated on the next one.
+    """
+
+    def __init__(self, config, columns=None):
+        self.config = config
+        self.agents = AgentPool()
+        self.grid = SpatialGrid(config.infection_radius)
+        self.neighbor_lists = None # NeighborLists with config.use_neighbor_lists, contacts are found in the grid otherwise
+        if config.use_neighbor_lists:
+            skin = max(1.0, config.neighbor_skin) * 2 * math.sqrt(2) * config.max_speed * max(config.day_in_week_modifier)
+            self.neighbor_lists = NeighborLists((config.infection_radius, config.reproduction_radius), skin)
+        self.next_id = 0
+        self.events = None # event log (streaming.EventLog) recording changes of agents, if any
+        self.profiler = None # profiling.Profiler timing the phases of a day, if any
+        self.stopped = None # (day, reason) of a run ended by a StoppingRule before max_days
+        if columns is None: self.create_agents()
+        else: self.load_columns(columns)
+        self.counters = Counters(*gather_stats(self.agents))
+
+    def create_agents(self):
+        config = self.config
+        rng = phase_random(config.seed, 0, Phase.Init)
+        for _ in range(0, config.num_agents):
+            x = rng.randint(0, config.world_width)
+            y = rng.randint(0, config.world_height)
+            agent = Agent(x, y, Status.Susceptible, config, rng)
+            if rng.random() < config.infected_on_start: agent.status = Status.Infected
+            if rng.random() < config.anti_vaccine_percentage: agent.anti_vaccine = True
+            if rng.random() < config.fearful_percentage: agent.fearful = True
+            self.add(agent)
+
+    def add(self, agent):
+        agent.id = self.next_id
+        self.next_id += 1
+        self.agents.add(agent)
+        self.grid.insert(agent)
+
+    def load_columns(self, columns):
+        count = len(columns["x"])
+        rng = phase_random(self.config.seed, 0, Phase.Init)
+        velocity_x = columns.get("velocity_x", np.zeros(count)).tolist()
+        velocity_y = columns.get("velocity_y", np.zeros(count)).tolist()
+        values = {name: np.asarray(columns[name]).tolist() for name in AGENT_COLUMNS}
+        ids = columns.get("ids", np.arange(count)).tolist()
+        self.next_id = int(columns.get("next_id", count))
+
+        agents = [None] * count
+        for i in range(count):
+            agent = Agent(values["x"][i], values["y"][i], Status(values["status"][i]), self.config, rng)
+            agent.id = ids[i]
+            agent.velocity = [velocity_x[i], velocity_y[i]]
+            agent.infected_days = values["infected_days"][i]
+            agent.immune_days = values["immune_days"][i]
+            agent.days_old = values["days_old"][i]
+            agent.anti_vaccine = values["anti_vaccine"][i]
+            agent.fearful = values["fearful"][i]
+            agents[i] = agent
+
+        self.agents = AgentPool(agents)
+        # Agents are visited in grid order during a day, restore it so a resumed run draws the same numbers
+        grid_order = columns.get("grid_order", np.zeros(count, dtype=np.int64))
+        for i in np.argsort(grid_order, kind="stable"):
+            self.grid.insert(agents[i])
+
+    def to_columns(self):
+        columns = {
+            name: np.array([getattr(agent, name) for agent in self.agents], dtype=dtype)
+            for name, dtype in AGENT_COLUMNS.items() if name != "status"
+        }
+        columns["status"] = np.array([agent.status.value for agent in self.agents], dtype=np.int8)
+        columns["velocity_x"] = np.array([agent.velocity[0] for agent in self.agents], dtype=np.float64)
+        columns["velocity_y"] = np.array([agent.velocity[1] for agent in self.agents], dtype=np.float64)
+        order_in_cell = {agent: order for cell in self.grid.cells.values() for order, agent in enumerate(cell)}
+        columns["grid_order"] = np.array([order_in_cell[agent] for agent in self.agents], dtype=np.int64)
+        columns["ids"] = np.array([agent.id for agent in self.agents], dtype=np.int64)
+        columns["next_id"] = np.array(self.next_id)
+        return columns
+
+    def __len__(self):
+        return len(self.agents)
+
+    def step(self, day) -> int:
+        """Simulates one day, returns the number of agents vaccined today."""
+        max_speed = self.config.max_speed * self.config.day_in_week_modifier[day % 7]
+        profiler = self.profiler
+        streams = DayStreams(self.config.seed, day, counting=profiler is not None)
+        counters = self.counters
+        counters.start_day()
+        if self.events is not None: self.events.day = day + 1 # events show in the stats row of the next day
+        if profiler is not None: profiler.mark()
+        lists = self.neighbor_lists
+        if lists is not None:
+            lists.start_day(self.grid, self.agents, max_speed)
+            if profiler is not None: profiler.lap("infection")
+        dead, newborns, spreaders = [], [], []
+        for agent in self.agents:
+            agent.move(max_speed, streams.move)
+            self.grid.update(agent)
+            if profiler is not None: profiler.lap("move")
+            infected = agent.status == Status.Infected
+            result = agent.simulate_day(
+                self.agents, counters, streams, lists or self.grid, self.events, profiler, far_draws=not self.config.use_neighbor_lists
+            )
+            if result == "DEAD":
+                self.grid.remove(agent) # out of reach of the others right away
+                if lists is not None: lists.remove(agent)
+                dead.append(agent)
+            else:
+                if infected: spreaders.append(agent)
+                if result is not None: newborns.append((result, agent)) # reproduction happened
+
+        # Deaths and births take effect at the end of the day, every agent alive at its start is simulated once
+        for agent in dead: self.agents.remove(agent)
+        if self.config.single_draw_infection: self.infect(spreaders, streams, lists or self.grid)
+        for child, parent in newborns:
+            self.add(child)
+            if lists is not None: lists.add(self.grid, child)
+            counters.birth()
+            if self.events is not None: self.events.record(Event.Birth, child.id, parent.id)
+        if profiler is not None:
+            profiler.lap("bookkeeping")
+            profiler.count("rng_draws", streams.draws())
+            if lists is not None:
+                profiler.count("distance_checks", lists.checks)
+                lists.checks = 0
+        return counters.vaccined
+
+    def infect(self, spreaders, streams, contacts):
+        """Single draw infection of the day, after every agent moved.
+
+        Every spreader in range (infected at the start of the day and still alive) is an
+        independent chance of infection, the same as in Agent.simulate_day, so one draw per
+        exposed susceptible agent decides it. Agents infected today start spreading tomorrow.
+        The masked half radius test is always covered by the full radius one, so masks do
+        not change who is in range. contacts is the grid or the neighbor lists.
+        """
+        config = self.config
+        profiler = self.profiler
+        exposed = {} # susceptible agent -> spreaders in range
+        for spreader in spreaders:
+            for other in contacts.around(spreader, config.infection_radius):
+                if other.status == Status.Susceptible:
+                    if profiler is not None: profiler.count("distance_checks")
+                    if spreader.distance_squared(other) < config.infection_radius ** 2:
+                        exposed.setdefault(other, []).append(spreader)
+
+        for agent, sources in exposed.items():
+            infection_probability = 1 - (1 - config.infection_probability) ** len(sources)
+            u = streams.infection.random()
+            if u < infection_probability:
+                agent.status = Status.Infected
+                agent.infected_days = 0
+                self.counters.infect()
+                if self.events is not None: # u is uniform below infection_probability, it also picks the infector
+                    infector = sources[min(int(u / infection_probability * len(sources)), len(sources) - 1)]
+                    self.events.record(Event.Infection, agent.id, infector.id)
+        if profiler is not None: profiler.lap("infection")
+
+    def gather_stats(self):
+        return self.counters.compartments()
+
+    def find_at(self, x, y, radius):
+        """Agent closer than radius to the given point, None if there is no such agent."""
+        for agent in self.grid.nearby(x, y, radius):
+            if (agent.x - x) ** 2 + (agent.y - y) ** 2 <= radius ** 2:
+                return agent
+        return None
+
+    def get_info_list(self, agent) -> list[str]:
+        return agent.get_info_list()
+
+
+
+# --- Vectorized engine ---
+
+PAIR_CHUNK_SIZE = 2 ** 22 # max number of candidate pairs held in memory at once
+LOOKUP_CELL_SIZE = 16 # of the index answering find_at
+MEAN_FIELD_CELLS_PER_RADIUS = 4 # cells of mean-field infection across the infection radius
+NEVER = np.iinfo(np.int64).max # planned day of an event that never happens
+
+# Planned day (step day) of the next event of every agent, kept in the event calendar mode
+PLAN_COLUMNS = {
+    "death_day": np.int64, # natural death
+    "outcome_day": np.int64, # cure or death due to disease
+    "outcome_dies": np.bool_,
+    "immunity_end_day": np.int64,
+}
+
+
+def count_within_radius(sources_x, sources_y, targets_x, targets_y, radius, cell_size, profiler=None):
+    """For every target, count the sources closer than radius."""
+    counts = np.zeros(len(targets_x), dtype=np.int64)
+    if len(sources_x) == 0 or len(targets_x) == 0: return counts
+
+    if len(sources_x) * len(targets_x) <= PAIR_CHUNK_SIZE:
+        # Few agents, checking all pairs at once is cheaper than building the index
+        if profiler is not None: profiler.count("distance_checks", len(sources_x) * len(targets_x))
+        dx = sources_x[:, None] - targets_x[None, :]
+        dy = sources_y[:, None] - targets_y[None, :]
+        return np.count_nonzero(dx ** 2 + dy ** 2 < radius ** 2, axis=0)
+
+    index = CellIndex(sources_x, sources_y, cell_size)
+    for targets, sources in index.candidate_pairs(targets_x, targets_y, radius):
+        if profiler is not None: profiler.count("distance_checks", len(targets))
+        close = (sources_x[sources] - targets_x[targets]) ** 2 + (sources_y[sources] - targets_y[targets]) ** 2 < radius ** 2
+        counts += np.bincount(targets[close], minlength=len(targets_x))
+    return counts
+
+
+def mean_field_contacts(sources_x, sources_y, targets_x, targets_y, radius):
+    """For every target, the expected number of sources closer than radius, from source counts of nearby cells.
+
+    Sources are counted in cells of radius / MEAN_FIELD_CELLS_PER_RADIUS. A target gets the
+    counts of all cells with centres closer than radius to the centre of its own cell, scaled
+    so that these cells cover the area of the circle. Costs one pass over the agents and the
+    cells instead of a pair search.
+    """
+    contacts = np.zeros(len(targets_x))
+    if len(sources_x) == 0 or len(targets_x) == 0: return contacts
+
+    cell_size = max(1, radius) / MEAN_FIELD_CELLS_PER_RADIUS
+    columns = int(max(sources_x.max(), targets_x.max()) // cell_size) + 1
+    rows = int(max(sources_y.max(), targets_y.max()) // cell_size) + 1
+    def cells(x, y):
+        return np.clip((y // cell_size).astype(np.int64), 0, rows - 1), np.clip((x // cell_size).astype(np.int64), 0, columns - 1)
+
+    reach = MEAN_FIELD_CELLS_PER_RADIUS
+    padded = np.zeros((rows + 2 * reach, columns + 2 * reach))
+    source_rows, source_columns = cells(sources_x, sources_y)
+    np.add.at(padded, (source_rows + reach, source_columns + reach), 1)
+
+    offsets = [(dr, dc) for dr in range(-reach, reach + 1) for dc in range(-reach, reach + 1) if (dr ** 2 + dc ** 2) * cell_size ** 2 < radius ** 2]
+    pressure = np.zeros((rows, columns))
+    for dr, dc in offsets:
+        pressure += padded[reach + dr : reach + dr + rows, reach + dc : reach + dc + columns]
+    scale = math.pi * radius ** 2 / (len(offsets) * cell_size ** 2)
+    return pressure[cells(targets_x, targets_y)] * scale
+
+
+def pick_neighbor(sources_x, sources_y, candidates_x, candidates_y, radius, cell_size, choices, profiler=None, candidate_ids=None):
+    """For every source, index of a candidate closer than radius (-1 if none).
+
+    choices are uniform [0, 1) numbers, one per source. Every candidate in range gets a
+    score hashed from the source's choice and the candidate's id (its index when no ids
+    are given) and the lowest score wins, so the pick is uniform and does not depend on
+    chunking or on the order of candidates. Only the best candidate so far is kept per
+    source, memory does not grow with the number of pairs in range.
+    """
+    picked = np.full(len(sources_x), -1, dtype=np.int64)
+    if len(sources_x) == 0 or len(candidates_x) == 0: return picked
+
+    if len(sources_x) * len(candidates_x) <= PAIR_CHUNK_SIZE:
+        pairs = [(np.repeat(np.arange(len(sources_x)), len(candidates_x)), np.tile(np.arange(len(candidates_x)), len(sources_x)))]
+    else:
+        pairs = CellIndex(candidates_x, candidates_y, cell_size).candidate_pairs(sources_x, sources_y, radius)
+
+    keys = (np.asarray(choices) * 2.0 ** 53).astype(np.uint64)
+    if candidate_ids is None: candidate_ids = np.arange(len(candidates_x))
+    candidate_ids = np.asarray(candidate_ids).astype(np.uint64)
+    best = np.zeros(len(sources_x), dtype=np.uint64)
+    for sources, candidates in pairs:
+        if profiler is not None: profiler.count("distance_checks", len(sources))
+        close = (sources_x[sources] - candidates_x[candidates]) ** 2 + (sources_y[sources] - candidates_y[candidates]) ** 2 < radius ** 2
+        sources, candidates = sources[close], candidates[close]
+        if len(sources) == 0: continue
+        scores = mix(keys[sources] ^ (candidate_ids[candidates] * np.uint64(0x9E3779B97F4A7C15)))
+
+        # Keep the lowest score per source, lexsort puts it first in every group of equal sources
+        order = np.lexsort((scores, sources))
+        first = order[np.append(True, sources[order][1:] != sources[order][:-1])]
+        group_sources = sources[first]
+        better = (picked[group_sources] < 0) | (scores[first] < best[group_sources])
+        best[group_sources[better]] = scores[first][better]
+        picked[group_sources[better]] = candidates[first][better]
+    return picked
+
+
+def geometric(u, p):
+    """Daily trials with success probability p up to and including the first success, NEVER for p = 0.
+
+    u are uniform [0, 1) numbers, one per sample.
+    """
+    if p <= 0: return np.full(len(u), NEVER, dtype=np.int64)
+    if p >= 1: return np.ones(len(u), dtype=np.int64)
+    return np.maximum(1, np.ceil(np.log1p(-u) / np.log1p(-p))).astype(np.int64)
+
+
+class Calendar:
+    """Agent ids bucketed by the day of a planned event, a day only touches the agents due on it.
+
+    Plans are not withdrawn when they change or the agent dies, callers check popped
+    agents against the planned days they keep (PLAN_COLUMNS).
+    """
+
+    def __init__(self):
+        self.buckets = {} # day -> [id arrays]
+
+    def schedule(self, ids, days):
+        planned = days != NEVER
+        ids, days = ids[planned], days[planned]
+        if len(ids) == 0: return
+        order = np.argsort(days, kind="stable")
+        ids, days = ids[order], days[order]
+        unique_days, starts = np.unique(days, return_index=True)
+        for day, day_ids in zip(unique_days.tolist(), np.split(ids, starts[1:])):
+            self.buckets.setdefault(day, []).append(day_ids)
+
+    def pop(self, day) -> np.ndarray:
+        return np.concatenate(self.buckets.pop(day, [np.empty(0, dtype=np.int64)]))
+
+
+class VectorizedPopulation:
+    """Whole population kept as arrays, every phase of a day is one batched operation.
+
+    Follows the rules of AgentPopulation, with one difference: all agents are updated
+    at once instead of one after another, so an agent infected today starts spreading
+    the disease tomorrow.
+
+    With config.use_event_calendar natural death, the disease outcome and the end of
+    immunity are not checked every day: the day of each is drawn from the geometric
+    distribution once the agent's state allows it and kept in a Calendar.
+    """
+
+    def __init__(self, config, columns=None):
+        self.config = config
+        self.events = None # event log (streaming.EventLog) recording changes of agents, if any
+        self.profiler = None # profiling.Profiler timing the phases of a day, if any
+        self.stopped = None # (day, reason) of a run ended by a StoppingRule before max_days
+        self.lookup = None # CellIndex of current positions for find_at, built on first use
+        self.calendar = None # Calendar of the event calendar mode, started on the first simulated day
+        self.death_day = None # plans (PLAN_COLUMNS) of the event calendar mode, None until made or loaded
+        if columns is None: self.create_agents()
+        else: self.load_columns(columns)
+        counts = np.bincount(self.status, minlength=Status.Recovered.value + 1)
+        self.counters = Counters(*(int(counts[status.value]) for status in Status))
+
+    def create_agents(self):
+        config = self.config
+        num_agents = config.num_agents
+        self.next_id = num_agents
+        self.ids = np.arange(num_agents, dtype=np.int64)
+        self.x = np.floor(self.uniform(0, Phase.Init, self.ids, 0) * (config.world_width + 1))
+        self.y = np.floor(self.uniform(0, Phase.Init, self.ids, 1) * (config.world_height + 1))
+        self.status = np.full(num_agents, Status.Susceptible.value, dtype=np.int8)
+        self.status[self.uniform(0, Phase.Init, self.ids, 2) < config.infected_on_start] = Status.Infected.value
+        self.infected_days = np.zeros(num_agents, dtype=np.int32)
+        self.immune_days = np.zeros(num_agents, dtype=np.int32)
+        self.days_old = np.zeros(num_agents, dtype=np.int32)
+        self.anti_vaccine = self.uniform(0, Phase.Init, self.ids, 3) < config.anti_vaccine_percentage
+        self.fearful = self.uniform(0, Phase.Init, self.ids, 4) < config.fearful_percentage
+
+    def load_columns(self, columns):
+        """Takes the agents sorted by id, the reference engine saves them in pool order."""
+        ids = np.array(columns.get("ids", np.arange(len(columns["x"]))), dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        for name, dtype in AGENT_COLUMNS.items():
+            setattr(self, name, np.array(columns[name], dtype=dtype)[order])
+        self.ids = ids[order]
+        self.next_id = int(columns.get("next_id", len(self.ids)))
+        if self.config.use_event_calendar and "death_day" in columns: # plans of a run resumed in the same mode
+            for name, dtype in PLAN_COLUMNS.items():
+                setattr(self, name, np.array(columns[name], dtype=dtype)[order])
+
+    def to_columns(self):
+        columns = {name: getattr(self, name) for name in self.column_names()}
+        columns["next_id"] = np.array(self.next_id)
+        return columns
+
+    def column_names(self):
+        """Names of all per agent arrays."""
+        if self.death_day is None: return ("ids", *AGENT_COLUMNS)
+        return ("ids", *AGENT_COLUMNS, *PLAN_COLUMNS)
+
+    def uniform(self, day, phase, ids, draw=0):
+        if self.profiler is not None: self.profiler.count("rng_draws", len(ids))
+        return agent_uniform(self.config.seed, day, phase, ids, draw)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_of(self, agent_id):
+        return int(np.flatnonzero(self.ids == agent_id)[0])
+
+    def get_info_list(self, agent_id) -> list[str]:
+        return agent_info_list(self, agent_id)
+
+    def mask(self, indices):
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[indices] = True
+        return mask
+
+    def step(self, day) -> int:
+        """Simulates one day, returns the number of agents vaccined today."""
+        if self.events is not None: self.events.day = day + 1 # events show in the stats row of the next day
+        self.lookup = None
+        self.counters.start_day()
+        if self.profiler is not None: self.profiler.mark()
+        self.move(self.config.max_speed * self.config.day_in_week_modifier[day % 7], day)
+        if self.profiler is not None: self.profiler.lap("move")
+        return self.simulate_day(day)
+
+    def move(self, max_speed, day):
+        moving = np.flatnonzero(self.uniform(day, Phase.Move, self.ids, 0) >= self.config.no_move_probability)
+        ids = self.ids[moving]
+        speed = np.where(self.fearful[moving], max_speed / 2, max_speed)
+
+        self.x[moving] = np.clip(self.x[moving] + (2 * self.uniform(day, Phase.Move, ids, 1) - 1) * speed, 0, self.config.world_width)
+        self.y[moving] = np.clip(self.y[moving] + (2 * self.uniform(day, Phase.Move, ids, 2) - 1) * speed, 0, self.config.world_height)
+
+    def simulate_day(self, day) -> int:
+        """Advances every agent by one day, returns the number of agents vaccined today."""
+        config = self.config
+        susceptible_value = Status.Susceptible.value
+        infected_value = Status.Infected.value
+        recovered_value = Status.Recovered.value
+        calendar = config.use_event_calendar
+        if calendar: due = self.due(day)
+
+        # Aging and natural death
+        self.days_old += 1
+        if calendar: dead = self.mask(due[self.death_day[due] == day])
+        else: dead = (self.days_old >= config.min_days_to_live) & (self.uniform(day, Phase.Death, self.ids, 0) < config.normal_death_probability)
+        for status_value, count in enumerate(np.bincount(self.status[dead], minlength=Status.Recovered.value + 1)):
+            if count: self.counters.death(status_value, int(count))
+
+        # Vaccination and immunity expiry
+        recovered = ~dead & (self.status == recovered_value)
+        vaccined = (
+            ~dead & ~self.anti_vaccine & (self.status == susceptible_value)
+            & (self.uniform(day, Phase.Vaccination, self.ids) < config.vaccined_percentage)
+        )
+        self.status[vaccined] = recovered_value
+        self.immune_days[vaccined] = 0
+        self.immune_days[recovered] += 1
+        if calendar: immunity_lost = recovered & self.mask(due[self.immunity_end_day[due] == day])
+        else: immunity_lost = recovered & (self.immune_days >= config.immunity_days)
+        self.status[immunity_lost] = susceptible_value
+        self.counters.vaccinate(int(np.count_nonzero(vaccined)))
+        self.counters.lose_immunity(int(np.count_nonzero(immunity_lost)))
+
+        # Death due to disease
+        infected = ~dead & (self.status == infected_value)
+        if calendar:
+            outcome = infected & self.mask(due[self.outcome_day[due] == day])
+            disease_dead = outcome & self.outcome_dies
+        else: disease_dead = infected & (self.uniform(day, Phase.Death, self.ids, 1) < config.disease_death_probability)
+        if self.events is not None:
+            self.events.record_many(Event.Death, self.ids[dead])
+            self.events.record_many(Event.Vaccination, self.ids[vaccined])
+            self.events.record_many(Event.DiseaseDeath, self.ids[disease_dead])
+        self.counters.disease_death(int(np.count_nonzero(disease_dead)))
+        dead |= disease_dead
+        spreaders = np.flatnonzero(infected & ~dead)
+        if self.profiler is not None: self.profiler.lap("bookkeeping")
+
+        # Infection, every infected neighbour is an independent chance of being infected
+        targets = np.flatnonzero(~dead & (self.status == susceptible_value))
+        if config.mean_field_infection:
+            contacts = mean_field_contacts(self.x[spreaders], self.y[spreaders], self.x[targets], self.y[targets], config.infection_radius)
+        else:
+            contacts = count_within_radius(
+                self.x[spreaders], self.y[spreaders], self.x[targets], self.y[targets],
+                config.infection_radius, config.infection_radius, self.profiler
+            )
+        escape_probability = (1 - config.infection_probability) ** contacts
+        newly_infected = targets[self.uniform(day, Phase.Infection, self.ids[targets]) >= escape_probability]
+        if self.events is not None: self.log_infections(day, newly_infected, spreaders)
+        if self.profiler is not None: self.profiler.lap("infection")
+
+        # Cure
+        self.infected_days[spreaders] += 1
+        if calendar: cured = spreaders[outcome[spreaders]]
+        else:
+            cured = spreaders[
+                (self.infected_days[spreaders] >= config.min_infected_days)
+                & (self.uniform(day, Phase.Cure, self.ids[spreaders]) < config.cure_probability)
+            ]
+        self.status[cured] = recovered_value
+        self.immune_days[cured] = 0
+        self.counters.cure(len(cured))
+        if self.events is not None: self.events.record_many(Event.Cure, self.ids[cured])
+
+        self.status[newly_infected] = infected_value
+        self.infected_days[newly_infected] = 0
+        self.counters.infect(len(newly_infected))
+        if calendar: # plans of agents that changed state today, from tomorrow on
+            self.plan_immunity(np.concatenate((np.flatnonzero(vaccined), cured)), day + 1)
+            self.plan_outcomes(newly_infected, day, day + 1)
+        if self.profiler is not None: self.profiler.lap("bookkeeping")
+
+        # Reproduction, every agent in range (itself included) is an independent chance
+        living = np.flatnonzero(~dead)
+        partners_count = count_within_radius(
+            self.x[living], self.y[living], self.x[living], self.y[living],
+            config.reproduction_radius, config.infection_radius, self.profiler
+        )
+        no_child_probability = (1 - config.reproduction_probability) ** partners_count
+        parents = living[self.uniform(day, Phase.Reproduction, self.ids[living], 0) >= no_child_probability]
+        partners = living[pick_neighbor(
+            self.x[parents], self.y[parents], self.x[living], self.y[living],
+            config.reproduction_radius, config.infection_radius,
+            self.uniform(day, Phase.Reproduction, self.ids[parents], 1), self.profiler, self.ids[living]
+        )]
+
+        child_x = (self.x[parents] + self.x[partners]) / 2
+        child_y = (self.y[parents] + self.y[partners]) / 2
+        parent_ids = self.ids[parents]
+        if self.profiler is not None: self.profiler.lap("reproduction")
+
+        self.remove(dead)
+        self.add_newborns(child_x, child_y, day)
+        self.counters.birth(len(parents))
+        if self.events is not None: self.events.record_many(Event.Birth, self.ids[len(self.ids) - len(parents):], parent_ids)
+        if self.profiler is not None: self.profiler.lap("bookkeeping")
+
+        return self.counters.vaccined
+
+    def due(self, day):
+        """Indices of agents with an event planned for the day, starts the calendar on the first day."""
+        if self.calendar is None: self.start_calendar(day)
+        ids = self.calendar.pop(day)
+        if len(self.ids) == 0: return np.empty(0, dtype=np.int64)
+        indices = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1) # ids only grow, so they stay sorted
+        return np.unique(indices[self.ids[indices] == ids])
+
+    def start_calendar(self, day):
+        """Plans events of all agents, or schedules the plans loaded from a checkpoint."""
+        self.calendar = Calendar()
+        if self.death_day is not None:
+            for name in ("death_day", "outcome_day", "immunity_end_day"):
+                days = getattr(self, name)
+                self.calendar.schedule(self.ids, np.where(days >= day, days, NEVER))
+            return
+
+        for name, value in self.empty_plans(len(self.ids)).items(): setattr(self, name, value)
+        self.plan_deaths(np.arange(len(self.ids)), day, day)
+        self.plan_outcomes(np.flatnonzero(self.status == Status.Infected.value), day, day)
+        self.plan_immunity(np.flatnonzero(self.status == Status.Recovered.value), day)
+
+    def empty_plans(self, count):
+        return {name: np.full(count, False if dtype is np.bool_ else NEVER, dtype=dtype) for name, dtype in PLAN_COLUMNS.items()}
+
+    def plan_deaths(self, indices, day, start):
+        """Plans natural death of agents as they are before the start day, numbers are drawn for day."""
+        days_old = self.days_old[indices].astype(np.int64)
+        trials = geometric(self.uniform(day, Phase.Death, self.ids[indices], 0), self.config.normal_death_probability)
+        first_check = np.maximum(0, self.config.min_days_to_live - days_old - 1) # days from start to the first check
+        self.death_day[indices] = np.where(trials == NEVER, NEVER, start + first_check + trials - 1)
+        self.calendar.schedule(self.ids[indices], self.death_day[indices])
+
+    def plan_outcomes(self, indices, day, start):
+        """Plans cure or death due to disease of infected agents, whichever comes first, from the start day."""
+        ids = self.ids[indices]
+        death_trials = geometric(self.uniform(day, Phase.Death, ids, 1), self.config.disease_death_probability)
+        cure_trials = geometric(self.uniform(day, Phase.Cure, ids), self.config.cure_probability)
+        first_cure = np.maximum(0, self.config.min_infected_days - self.infected_days[indices].astype(np.int64) - 1)
+
+        death = np.where(death_trials == NEVER, NEVER, death_trials - 1)
+        cure = np.where(cure_trials == NEVER, NEVER, first_cure + cure_trials - 1)
+        after = np.minimum(death, cure) # death is checked before cure on the same day
+        self.outcome_dies[indices] = death <= cure
+        self.outcome_day[indices] = np.where(after == NEVER, NEVER, start + after)
+        self.calendar.schedule(ids, self.outcome_day[indices])
+
+    def plan_immunity(self, indices, start):
+        """Plans the end of immunity of recovered agents from the start day, it lasts exactly immunity_days."""
+        immune_days = self.immune_days[indices].astype(np.int64)
+        self.immunity_end_day[indices] = start + np.maximum(0, self.config.immunity_days - immune_days - 1)
+        self.calendar.schedule(self.ids[indices], self.immunity_end_day[indices])
+
+    def log_infections(self, day, newly_infected, spreaders):
+        """Records infections, the infector is one of the spreaders in range picked at random.
+
+        Mean-field infections can have no spreader in range, their infector is -1.
+        """
+        infectors = pick_neighbor(
+            self.x[newly_infected], self.y[newly_infected], self.x[spreaders], self.y[spreaders],
+            self.config.infection_radius, self.config.infection_radius,
+            self.uniform(day, Phase.Infection, self.ids[newly_infected], 1), candidate_ids=self.ids[spreaders]
+        )
+        other_ids = np.where(infectors >= 0, self.ids[spreaders][infectors], -1)
+        self.events.record_many(Event.Infection, self.ids[newly_infected], other_ids)
+
+    def remove(self, mask):
+        keep = ~mask
+        for name in self.column_names():
+            setattr(self, name, getattr(self, name)[keep])
+
+    def add_newborns(self, x, y, day):
+        count = len(x)
+        ids = np.arange(self.next_id, self.next_id + count)
+        self.ids = np.concatenate((self.ids, ids))
+        self.next_id += count
+        self.x = np.concatenate((self.x, x))
+        self.y = np.concatenate((self.y, y))
+        self.status = np.concatenate((self.status, np.full(count, Status.Susceptible.value, dtype=np.int8)))
+        self.infected_days = np.concatenate((self.infected_days, np.zeros(count, dtype=np.int32)))
+        self.immune_days = np.concatenate((self.immune_days, np.zeros(count, dtype=np.int32)))
+        self.days_old = np.concatenate((self.days_old, np.zeros(count, dtype=np.int32)))
+        self.anti_vaccine = np.concatenate((self.anti_vaccine, self.uniform(day, Phase.Newborn, ids, 0) < self.config.anti_vaccine_percentage))
+        self.fearful = np.concatenate((self.fearful, self.uniform(day, Phase.Newborn, ids, 1) < self.config.fearful_percentage))
+
+        if self.death_day is not None:
+            for name, value in self.empty_plans(count).items(): setattr(self, name, np.concatenate((getattr(self, name), value)))
+            self.plan_deaths(np.arange(len(self.ids) - count, len(self.ids)), day, day + 1)
+
+    def gather_stats(self):
+        return self.counters.compartments()
+
+    def find_at(self, x, y, radius):
+        return find_agent_at(self, x, y, radius)
+
+
+
+# --- Early termination ---
+
+FAST_FORWARD_WINDOW = 28 # last simulated days the birth rate of FastForward is measured over
+
+
+class StoppingRule:
+    """Tells when a run can end before max_days, from the counters row of every simulated day.
+
+    The run ends after config.stop_after_quiet_days days in a row without infected agents,
+    or after config.stationary_days days in which no compartment moved by more than
+    config.stationary_tolerance of the population.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.rows = collections.deque(maxlen=max(config.stationary_days, FAST_FORWARD_WINDOW))
+        self.quiet_days = 0
+
+    def update(self, row):
+        """Takes the row of the next day, returns why the run should end, or None."""
+        config = self.config
+        self.rows.append(row)
+        self.quiet_days = self.quiet_days + 1 if row[Status.Infected.value - 1] == 0 else 0
+        if 0 < config.stop_after_quiet_days <= self.quiet_days:
+            return f"no infected agents for {self.quiet_days} days"
+
+        if 0 < config.stationary_days <= len(self.rows):
+            recent = np.array(list(self.rows)[-config.stationary_days:])[:, :len(Status)]
+            population = max(1, recent[-1].sum())
+            if (recent.max(axis=0) - recent.min(axis=0)).max() <= config.stationary_tolerance * population:
+                return f"counts stationary for {config.stationary_days} days"
+        return None
+
+    def check(self, population, day) -> bool:
+        """Takes the simulated day of population, True (with population.stopped set) if the run ends there."""
+        if day >= self.config.max_days: return False
+        reason = self.update(population.counters.row())
+        if reason is None: return False
+        population.stopped = (day, reason)
+        return True
+
+
+def stopping_rule(config):
+    """StoppingRule of the config, None if it never ends a run early."""
+    if config.stop_after_quiet_days > 0 or config.stationary_days > 0: return StoppingRule(config)
+    return None
+
+
+def fast_forward(config, population, rule, day, stats) -> int:
+    """Rows of a FastForward up to max_days for a stopped run without infected agents (with config.fast_forward), returns the last day."""
+    infected = population.counters.statuses[Status.Infected.value]
+    if population.stopped is None or not config.fast_forward or not config.gather_stats or infected > 0: return day
+    forward = FastForward(config, population.to_columns(), rule.rows)
+    while day < config.max_days:
+        stats.append(forward.step())
+        day += 1
+    return day
+
+
+class FastForward:
+    """Expected counts of a population without infected agents, advanced without simulating agents.
+
+    Agents are counted in groups by anti vaccine flag, status with days of immunity and age,
+    and every day the rules of Agent.simulate_day move expected numbers between groups.
+    An agent reproduces with agents in its reproduction radius, whose number grows with the
+    density, so births per day follow the population squared, scaled by the births measured
+    over the last FAST_FORWARD_WINDOW simulated days. Daily counts are rounded so that they
+    add up over the days.
+
+    It stays an estimate: agents cluster where they were born and clusters reproduce faster
+    than the mean density says, which counts cannot follow. Against full runs (benchmark.py
+    --fast-forward: 500 agents, 150 days, 6 seeds, all stopped after 30 quiet days) births
+    after the stop are 57 % low (63 % with a birth rate fixed per agent), and on the last day
+    susceptible agents are 41 % and recovered ones 11 % low. Most of the gap is one seed whose
+    full run booms late; use it for the shape of a quiet tail, not for its size.
+    """
+
+    def __init__(self, config, columns, rows):
+        self.config = config
+        immunity_days = max(1, config.immunity_days)
+        old = max(1, config.min_days_to_live)
+        # Agents by [anti vaccine, 0 when susceptible or 1 + immune days, min(days old, min_days_to_live)]
+        self.counts = np.zeros((2, immunity_days + 1, old + 1))
+        recovered = columns["status"] == Status.Recovered.value
+        state = np.where(recovered, 1 + np.minimum(columns["immune_days"], immunity_days - 1), 0)
+        age = np.minimum(columns["days_old"], old)
+        np.add.at(self.counts, (columns["anti_vaccine"].astype(np.intp), state, age), 1)
+
+        rows = np.array(rows, dtype=np.float64)
+        births = rows[:, len(Status) + Counters.DAILY.index("births")].sum()
+        self.birth_rate = births / max(1.0, (rows[:, :len(Status)].sum(axis=1) ** 2).sum()) # per pair of agents
+        self.totals = dict.fromkeys(Counters.DAILY, 0.0) # expected changes since the start, unrounded
+        self.rounded = dict.fromkeys(Counters.DAILY, 0)
+
+    def step(self) -> list[int]:
+        """Advances one day, returns its stats row."""
+        config = self.config
+        counts = self.counts
+        daily = dict.fromkeys(Counters.DAILY, 0.0)
+
+        # Ageing and natural deaths
+        counts[..., -1] += counts[..., -2]
+        counts[..., 1:-1] = counts[..., :-2]
+        counts[..., 0] = 0
+        deaths = counts[..., -1] * config.normal_death_probability
+        counts[..., -1] -= deaths
+        daily["deaths"] = deaths.sum()
+
+        # Vaccination of susceptible agents, immunity of the others
+        vaccined = counts[0, 0] * config.vaccined_percentage
+        lost = counts[:, -1].copy()
+        counts[:, 2:] = counts[:, 1:-1]
+        counts[:, 1] = 0
+        counts[0, 1] = vaccined
+        counts[0, 0] -= vaccined
+        counts[:, 0] += lost
+        daily["vaccined"] = vaccined.sum()
+        daily["immunity_losses"] = lost.sum()
+
+        # Newborns, first counted on the next day
+        births = self.birth_rate * counts.sum() ** 2
+        counts[1, 0, 0] += births * config.anti_vaccine_percentage
+        counts[0, 0, 0] += births * (1 - config.anti_vaccine_percentage)
+        daily["births"] = births
+
+        row = [round(counts[:, 0].sum()), 0, round(counts[:, 1:].sum())]
+        for name in Counters.DAILY:
+            self.totals[name] += daily[name]
+            total = round(self.totals[name])
+            row.append(total - self.rounded[name])
+            self.rounded[name] = total
+        return row
+
+
+
+# --- Other functions ---
+
+def gather_stats(agents):
+    susceptible = 0
+    infected = 0
+    recovered = 0
+
+    for x in agents:
+        if x.status == Status.Susceptible: susceptible += 1
+        elif x.status == Status.Infected: infected += 1
+        else: recovered += 1
+
+    return susceptible, infected, recovered
+
+
+# Config field -> label on the start screen
+PARAMETER_LABELS = {
+    "fps": "FPS",
+    "world_width": "World width",
+    "world_height": "World height",
+    "num_agents": "Agents count",
+    "max_days": "Maximum simulation duration in days",
+    "gather_stats": "Gather stats data",
+    "show_view": "Show simulation view",
+    "use_vectorized_engine": "Use vectorized engine",
+    "seed": "Random seed",
+    "checkpoint_every": "Checkpoint interval in days (0 for none)",
+    "log_events": "Log agent events",
+    "render_every": "Draw every Nth simulated day",
+    "simulate_in_thread": "Simulate in background thread",
+    "profile": "Profile phases of a day",
+    "use_event_calendar": "Use event calendar (vectorized engine)",
+    "workers": "Worker processes of one simulation (0 for none)",
+    "stop_after_quiet_days": "Stop after days without infected (0 for never)",
+    "stationary_days": "Stop after days of stationary counts (0 for never)",
+    "stationary_tolerance": "Tolerance of stationary counts (part of population)",
+    "fast_forward": "Fast-forward expected counts after stopping",
+    "use_neighbor_lists": "Use neighbor lists (reference engine)",
+    "neighbor_skin": "Neighbor list margin in days of movement",
+    "mean_field_infection": "Use mean-field infection (vectorized engine)",
+    "single_draw_infection": "Use single draw infection (reference engine)",
+
+    "no_move_probability": "Probability of agent staying in one place",
+    "max_speed": "Maximum distance per day",
+    "vaccined_percentage": "Percentage of population vaccined every day",
+    "masked_percentage": "Percentage of population masked every day",
+    "fearful_percentage": "Percentage of population being fearful",
+    "anti_vaccine_percentage": "Percentage of population being anti vaccine",
+    "min_days_to_live": "Minimum normal life duration",
+    "normal_death_probability": "Probability of natural death",
+    "reproduction_probability": "Probability of reproduction ",
+    "reproduction_radius": "Reproduction radius",
+    "day_in_week_modifier": "Modifiers of maximum distance per day during week",
+
+    "infection_radius": "Infection radius",
+    "infection_probability": "Infection probability",
+    "infected_on_start": "Percentage of population infected on start",
+    "min_infected_days": "Minimum infection duration",
+    "cure_probability": "Curing probability after minimum days",
+    "immunity_days": "Immunity duration after curied",
+    "disease_death_probability": "Probability of death due to infection",
+}
+
+# Tuning knobs of headless runs, set in scenario files and flags, the start screen leaves them at their defaults
+HEADLESS_PARAMETERS = (
+    "log_events", "profile", "workers", "stop_after_quiet_days", "stationary_days", "stationary_tolerance", "fast_forward", "neighbor_skin"
+)
+
+
+def get_params(config):
+    """Config as start screen strings, keyed by label."""
+    params = {}
+    for name, label in PARAMETER_LABELS.items():
+        value = getattr(config, name)
+        if isinstance(value, list): params[label] = str(value)[1 : -1]
+        else: params[label] = str(value)
+    return params
+
+
+def parse_value(field_type, text):
+    if field_type is bool: return text.strip().lower() == "true"
+    if field_type == int | None: return None if text.strip() in ("", "None") else int(text)
+    if field_type == list[float]: return [float(x) for x in text.split(",")]
+    return field_type(text)
+
+
+def parse_params(params):
+    """Config from start screen strings keyed by label."""
+    types = {field.name: field.type for field in dataclasses.fields(Config)}
+    values = {name: parse_value(types[name], params[label]) for name, label in PARAMETER_LABELS.items()}
+    return Config(**values)
+
+
+def resolve_seed(config):
+    """Config with a fixed seed, so the run can be repeated."""
+    if config.seed is not None: return config
+    return dataclasses.replace(config, seed=new_seed())
+
+
+def create_population(config, columns=None):
+    """New population, or the one saved in columns (see AGENT_COLUMNS) when given."""
+    config = resolve_seed(config)
+    if config.workers > 1:
+        import parallel # imports this module, so not at the top
+        return parallel.ParallelPopulation(config, columns)
+    if config.use_vectorized_engine: return VectorizedPopulation(config, columns)
+    return AgentPopulation(config, columns)
+
+
+def run_simulation(config, population=None, day=0, stats=None, on_day=None):
+    """Runs the simulation without view up to config.max_days, returns stats rows of every day.
+
+    population, day and stats continue a resumed run. stats can also be a streaming.StatsWriter
+    writing rows to disk as they come. on_day(population, day, stats) is called after every simulated day.
+
+    A run meeting a stopping rule of the config ends early with population.stopped set. With
+    config.fast_forward and no infected agents left, the remaining days get rows of a FastForward
+    instead, on_day is not called for them as the population does not change.
+    """
+    if population is None: population = create_population(config)
+    rule = stopping_rule(config)
+
+    if stats is None: stats = []
+    if config.gather_stats and len(stats) == 0:    # 0th day
+        stats.append(population.counters.row())
+
+    profiler = population.profiler
+    while day < config.max_days:
+        population.step(day)
+        day += 1
+        if config.gather_stats:
+            if profiler is None: stats.append(population.counters.row())
+            else:
+                with profiler.phase("gather_stats"): stats.append(population.counters.row())
+        if profiler is not None: profiler.end_day(day)
+        if on_day is not None: on_day(population, day, stats)
+        if rule is not None and rule.check(population, day): break
+
+    fast_forward(config, population, rule, day, stats)
+    return stats
+
+
+def write_stats(stats, path=STATS_PATH):
+    path = pathlib.Path(path)
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(STATS_COLUMNS)
+        for i, stat in enumerate(stats):
+            writer.writerow([i] + list(stat))
@@ -1,20 +1,31 @@
 from typing import Union
 
+import functools
+import numpy as np
 import pygame
-import random
 import sys
-import enum
-import csv
-import pathlib
+import threading
+
+import checkpoint
+import profiling
+import recording
+import simulation
+import streaming
+from simulation import WIDTH, HEIGHT, Status
 
 
 
 # --- Constants ---
 
 # Pygame 
-WIDTH, HEIGHT = 1200, 1000 # window size
 DOT_SIZE = 7 # of agents
 WINDOW_TITLE = "Simulation of disease spread in a population"
+TEXT_CACHE_SIZE = 1024 # rendered texts kept for reuse
+ZOOM_STEP = 1.25 # per mouse wheel notch
+MAX_ZOOM = 8 # pixels per world unit
+MINIMAP_SIZE = 200 # of the longer side of the density minimap, in pixels
+MINIMAP_CELLS = 100 # density cells along the longer side of the world
+ROW_HEIGHT = 32 # of a start screen field, fields that do not fit go to further pages
 
 # Colors
 WHITE = (255, 255, 255)
@@ -26,211 +37,209 @@ LIGHT_GRAY = (200, 200, 200)
 
 
 
-# --- Parameters --- (user modifiable)
-
-# Simulation
-FPS = 60 
-NUM_AGENTS = 500  
-MAX_DAYS = 365 * 2 
-GATHER_STATS = True
-SHOW_VIEW = True
-
-# Agents parameters
-NO_MOVE_PROBABILITY = 0.3
-MAX_SPEED = 10 # of agents (max distance per day)
-DAY_IN_WEEK_MODIFIER = [0.2, 0.5, 0.8, 0.4, 0.3, 1, 0.9] # of max speed through the week
-VACCINED_PERCENTAGE = 0.01 # of modifing agents status every day
-MASKED_PERCENTAGE = 0.02 # of agents every day
-FEARFUL_PERCENTAGE = 0.2 # of new agents after creating
-ANTI_VACCINE_PERCENTAGE = 0.1 # of new agents after creating
-MIN_DAYS_TO_LIVE = 100 # normal live
-NORMAL_DEATH_PROBABILITY = 0.01 # after min_days_to_live
-REPRODUCTION_PROBABILITY = 0.00129 # every day
-REPRODUCTION_RADIUS = 30
-
-# Disease
-INFECTION_RADIUS = 50  
-INFECTION_PROBABILITY = 0.1
-INFECTED_ON_START = 0.2 
-MIN_INFECTED_DAYS = 30
-CURE_PROBABILITY = 0.01 # after min_infected_days
-IMMUNITY_DAYS = 90 
-DISEASE_DEATH_PROBABILITY = 0.01 # every day
-
-
-
-# --- Agent ---
-
-class Status(enum.Enum):
-    Susceptible = 1
-    Infected = 2
-    Recovered = 3
-
-
-class Agent:
-    def __init__(self, x, y, status):
-        self.x = x
-        self.y = y
-        self.status = status
-        self.velocity = [random.uniform(-MAX_SPEED, MAX_SPEED), random.uniform(-MAX_SPEED, MAX_SPEED)]
-        self.infected_days = 0
-        self.immune_days = 0
-        self.anti_vaccine = False
-        self.fearful = False
-        self.days_old = 0
-
-    def get_info_list(self) -> list[str]:
-        return [
-            f"Coords: ({self.x:.2f}, {self.y:.2f})",
-            f"Status: {self.status.name}",
-            f"Days old: {self.days_old}",
-            f"Infected days: {self.infected_days}",
-            f"Immune days: {self.immune_days}",
-            f"Anti vaccine: {self.anti_vaccine}",
-            f"Fearful: {self.fearful}"
-        ]
-
-    def move(self):
-        if random.random() < NO_MOVE_PROBABILITY: return
-
-        if self.fearful: speed = MAX_SPEED / 2
-        else: speed = MAX_SPEED
-
-        self.velocity = [random.uniform(-speed, speed), random.uniform(-speed, speed)]
-        self.x += self.velocity[0]
-        self.y += self.velocity[1]
-
-        if self.x <= 0 or self.x >= WIDTH: 
-            self.velocity[0] = -self.velocity[0]
-            if self.x < 0: self.x = 0
-            elif self.x > WIDTH: self.x = WIDTH
-
-        if self.y <= 0 or self.y >= HEIGHT: 
-            self.velocity[1] = -self.velocity[1]
-            if self.y < 0: self.y = 0
-            elif self.y > HEIGHT: self.y = HEIGHT
-
-
-    def distance_squared(self, other):
-        return ((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
-
-
-    def draw(self, screen, selected=False):
-        if self.status == Status.Susceptible: color = GREEN
-        elif self.status == Status.Infected: color = RED
-        else: color = BLUE
-        pygame.draw.circle(screen, color, (int(self.x), int(self.y)), DOT_SIZE)
-        if selected:
-            pygame.draw.circle(screen, BLACK, (int(self.x), int(self.y)), DOT_SIZE + 3, 2)
-
-
-    def simulate_day(self, others, vaccined_today):
-        # Check if its time to die
-        self.days_old += 1
-        if self.days_old >= MIN_DAYS_TO_LIVE:
-            if random.random() < NORMAL_DEATH_PROBABILITY: return "DEAD"
-
-        # Check if agent is vaccinated
-        if self.anti_vaccine == False and self.status == Status.Susceptible:
-            if random.random() < VACCINED_PERCENTAGE:
-                self.status = Status.Recovered
-                self.immune_days = 0
-                vaccined_today[0] += 1
-
-        # Check if agent has still immunity
-        elif self.status == Status.Recovered:
-            self.immune_days += 1
-            if self.immune_days >= IMMUNITY_DAYS: self.status = Status.Susceptible
-
-        if self.status == Status.Infected:
-            # Check if agent is dead due to disease
-            if random.random() < DISEASE_DEATH_PROBABILITY:
-                return "DEAD"
-            
-            # Try to infect others
-            for other in others:
-                if other.status == Status.Susceptible:
-                    if (
-                        (random.random() < MASKED_PERCENTAGE and self.distance_squared(other) < (INFECTION_RADIUS / 2) ** 2) 
-                        or self.distance_squared(other) < INFECTION_RADIUS ** 2
-                    ):
-                        if random.random() < INFECTION_PROBABILITY:
-                            other.status = Status.Infected
-                            other.infected_days = 0
-
-            # Check if agent is cured
-            self.infected_days += 1
-            if self.infected_days >= MIN_INFECTED_DAYS:
-                if random.random() < CURE_PROBABILITY:
-                    self.status = Status.Recovered
-                    self.immune_days = 0
-
-        # Try to reproduce
-        for other in others:
-            if self.distance_squared(other) < REPRODUCTION_RADIUS ** 2 and random.random() < REPRODUCTION_PROBABILITY:
-                x = (self.x + other.x) / 2
-                y = (self.y + other.y) / 2
-                new_agent = Agent(x, y, Status.Susceptible)
-                if random.random() < ANTI_VACCINE_PERCENTAGE: new_agent.anti_vaccine = True
-                if random.random() < FEARFUL_PERCENTAGE: new_agent.fearful = True
-                return new_agent
+# --- Drawing ---
 
+@functools.lru_cache(maxsize=None)
+def get_font(size):
+    return pygame.font.SysFont(None, size)
 
 
-# --- Other functions ---
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text, size, color=BLACK):
+    """Rendered text, drawn again only when the text changes."""
+    return get_font(size).render(text, True, color)
+
+
+SPRITES = {} # Status value -> pre-rendered dot, filled on first draw
+
+
+def status_sprites():
+    """Dot of every status color, drawn once and then blitted for every agent."""
+    if not SPRITES:
+        for status, color in ((Status.Susceptible, GREEN), (Status.Infected, RED), (Status.Recovered, BLUE)):
+            sprite = pygame.Surface((2 * DOT_SIZE + 1, 2 * DOT_SIZE + 1), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color, (DOT_SIZE, DOT_SIZE), DOT_SIZE)
+            SPRITES[status.value] = sprite.convert_alpha()
+    return SPRITES
+
+
+class Camera:
+    """Part of the world shown in the window, world point (left, top) is drawn in the top left corner.
+
+    Dragging with the right mouse button pans, the mouse wheel zooms at the cursor and
+    Home shows the whole world again.
+    """
+
+    def __init__(self, world_width, world_height):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.fit()
+
+    def fit_zoom(self):
+        return min(WIDTH / self.world_width, HEIGHT / self.world_height)
+
+    def fit(self):
+        self.zoom = self.fit_zoom() # pixels per world unit
+        self.center_on(self.world_width / 2, self.world_height / 2)
+
+    def center_on(self, x, y):
+        self.left = x - WIDTH / 2 / self.zoom
+        self.top = y - HEIGHT / 2 / self.zoom
+
+    def to_screen(self, x, y):
+        return (x - self.left) * self.zoom, (y - self.top) * self.zoom
+
+    def to_world(self, screen_x, screen_y):
+        return self.left + screen_x / self.zoom, self.top + screen_y / self.zoom
+
+    def view_rect(self, margin=0):
+        """Part of the world in the window as (left, top, right, bottom), widened by margin pixels."""
+        margin /= self.zoom
+        return self.left - margin, self.top - margin, self.left + WIDTH / self.zoom + margin, self.top + HEIGHT / self.zoom + margin
+
+    def shows_all(self):
+        left, top, right, bottom = self.view_rect()
+        return left <= 0 and top <= 0 and right >= self.world_width and bottom >= self.world_height
+
+    def zoom_at(self, screen_x, screen_y, factor):
+        """Zooms keeping the world point under the cursor in place."""
+        x, y = self.to_world(screen_x, screen_y)
+        self.zoom = min(max(self.zoom * factor, self.fit_zoom() / 2), MAX_ZOOM)
+        self.left = x - screen_x / self.zoom
+        self.top = y - screen_y / self.zoom
+
+    def handle(self, event) -> bool:
+        """Pans or zooms on mouse and key events, True if the event was used."""
+        if event.type == pygame.MOUSEWHEEL:
+            self.zoom_at(*pygame.mouse.get_pos(), ZOOM_STEP ** event.y)
+        elif event.type == pygame.MOUSEMOTION and event.buttons[2]:
+            self.left -= event.rel[0] / self.zoom
+            self.top -= event.rel[1] / self.zoom
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_HOME:
+            self.fit()
+        else:
+            return False
+        return True
+
+
+def visible_arrays(population, camera):
+    """x, y and status values of agents in the window, for any population or recording.Frame.
+
+    Agents are looked up in the population's spatial index, so the cost follows the number
+    of agents in view, not in the world.
+    """
+    left, top, right, bottom = camera.view_rect(DOT_SIZE)
+    if isinstance(population, simulation.AgentPopulation):
+        agents = list(population.grid.in_rect(left, top, right, bottom))
+        x = np.fromiter((agent.x for agent in agents), dtype=np.float64, count=len(agents))
+        y = np.fromiter((agent.y for agent in agents), dtype=np.float64, count=len(agents))
+        status = np.fromiter((agent.status.value for agent in agents), dtype=np.int8, count=len(agents))
+    else:
+        if population.lookup is None: population.lookup = simulation.CellIndex(population.x, population.y, simulation.LOOKUP_CELL_SIZE)
+        indices = population.lookup.in_rect(left, top, right, bottom)
+        x, y, status = population.x[indices], population.y[indices], population.status[indices]
+    inside = (x >= left) & (x <= right) & (y >= top) & (y <= bottom)
+    return x[inside], y[inside], status[inside]
+
+
+def draw_population(screen, population, camera, selected=None):
+    """Draws agents in the window with a single blits call, selected is an Agent or an agent id."""
+    x, y, status = visible_arrays(population, camera)
+    screen_x, screen_y = camera.to_screen(x, y)
+    sprites = status_sprites()
+    left = (screen_x.astype(np.int64) - DOT_SIZE).tolist()
+    top = (screen_y.astype(np.int64) - DOT_SIZE).tolist()
+    screen.blits([(sprites[s], (l, t)) for l, t, s in zip(left, top, status.tolist())], doreturn=False)
+
+    if not camera.shows_all():
+        world_left, world_top = camera.to_screen(0, 0)
+        pygame.draw.rect(screen, LIGHT_GRAY, (world_left, world_top, camera.world_width * camera.zoom, camera.world_height * camera.zoom), 1)
+
+    if selected is None: return
+    if isinstance(population, simulation.AgentPopulation):
+        if selected in population.grid.agent_cells: center = camera.to_screen(selected.x, selected.y)
+        else: return
+    elif selected in population.ids:
+        index = population.index_of(selected)
+        center = camera.to_screen(population.x[index], population.y[index])
+    else: return
+    pygame.draw.circle(screen, BLACK, (int(center[0]), int(center[1])), DOT_SIZE + 3, 2)
+
+
+def draw_minimap(screen, population, camera):
+    """Density of all agents downsampled to a small image in the top right corner, returns its rect.
+
+    Darker is denser, the part of the world in the window is outlined in red. The reference
+    engine is counted from its grid cells, so it does not visit every agent.
+    """
+    cell_size = max(camera.world_width, camera.world_height) / MINIMAP_CELLS
+    columns = max(1, round(camera.world_width / cell_size))
+    rows = max(1, round(camera.world_height / cell_size))
+    if isinstance(population, simulation.AgentPopulation):
+        grid = population.grid
+        cells = list(grid.cells.items())
+        x = np.array([(column + 0.5) * grid.cell_size for (column, _), _ in cells])
+        y = np.array([(row + 0.5) * grid.cell_size for (_, row), _ in cells])
+        weights = np.array([len(agents) for _, agents in cells], dtype=np.float64)
+    else:
+        x, y, weights = population.x, population.y, None
+
+    column = np.clip((x // cell_size).astype(np.int64), 0, columns - 1)
+    row = np.clip((y // cell_size).astype(np.int64), 0, rows - 1)
+    density = np.bincount(row * columns + column, weights, minlength=rows * columns).reshape(rows, columns)
+    shade = (255 - 255 * np.log1p(density) / np.log1p(max(density.max(), 1))).astype(np.uint8)
+    image = pygame.image.frombuffer(np.repeat(shade[..., None], 3, axis=2).tobytes(), (columns, rows), "RGB")
+
+    scale = MINIMAP_SIZE / max(columns, rows)
+    rect = pygame.Rect(0, 0, round(columns * scale), round(rows * scale))
+    rect.topright = (WIDTH - 10, 10)
+    screen.blit(pygame.transform.scale(image, rect.size), rect)
+    pygame.draw.rect(screen, BLACK, rect, 1)
+
+    left, top, right, bottom = camera.view_rect()
+    scale = rect.width / camera.world_width
+    view = pygame.Rect(rect.x + left * scale, rect.y + top * scale, (right - left) * scale, (bottom - top) * scale)
+    pygame.draw.rect(screen, RED, view.clip(rect), 1)
+    return rect
+
+
+def minimap_to_world(rect, camera, position):
+    """World point shown at the given position of the minimap."""
+    scale = camera.world_width / rect.width
+    return (position[0] - rect.x) * scale, (position[1] - rect.y) * scale
 
-def gather_stats(agents):
-    susceptible = 0
-    infected = 0
-    recovered = 0
 
-    for x in agents:
-        if x.status == Status.Susceptible: susceptible += 1
-        elif x.status == Status.Infected: infected += 1
-        else: recovered += 1
+def draw_view(screen, population, camera, selected=None):
+    """Agents in the window and, when the window shows only part of the world, the minimap (its rect, None otherwise)."""
+    draw_population(screen, population, camera, selected)
+    if camera.shows_all(): return None
+    return draw_minimap(screen, population, camera)
 
-    return susceptible, infected, recovered
 
 
+# --- Other functions ---
+
 def draw_start_screen(window):
-    font = pygame.font.SysFont(None, 30)
-    big_font = pygame.font.SysFont(None, 60)
-
-    input_fields = {
-        "FPS": str(FPS),
-        "Agents count": str(NUM_AGENTS),
-        "Maximum simulation duration in days": str(MAX_DAYS),
-        "Gather stats data": str(GATHER_STATS),
-        "Show simulation view": str(SHOW_VIEW),
-        
-        "Probability of agent staying in one place": str(NO_MOVE_PROBABILITY),
-        "Maximum distance per day": str(MAX_SPEED),
-        "Percentage of population vaccined every day": str(VACCINED_PERCENTAGE),
-        "Percentage of population masked every day": str(MASKED_PERCENTAGE),
-        "Percentage of population being fearful": str(FEARFUL_PERCENTAGE),
-        "Percentage of population being anti vaccine": str(ANTI_VACCINE_PERCENTAGE),
-        "Minimum normal life duration": str(MIN_DAYS_TO_LIVE),
-        "Probability of natural death": str(NORMAL_DEATH_PROBABILITY),
-        "Probability of reproduction ": str(REPRODUCTION_PROBABILITY),
-        "Reproduction radius": str(REPRODUCTION_RADIUS),
-        "Modifiers of maximum distance per day during week": str(DAY_IN_WEEK_MODIFIER)[1 : -1],
-        
-        "Infection radius": str(INFECTION_RADIUS),
-        "Infection probability": str(INFECTION_PROBABILITY),
-        "Percentage of population infected on start": str(INFECTED_ON_START),
-        "Minimum infection duration": str(MIN_INFECTED_DAYS),
-        "Curing probability after minimum days": str(CURE_PROBABILITY),
-        "Immunity duration after curied": str(IMMUNITY_DAYS),
-        "Probability of death due to infection": str(DISEASE_DEATH_PROBABILITY),
-    }
+    """Form of the start screen parameters, paged with the arrow buttons or Page Up and Page Down."""
+    input_fields = simulation.get_params(simulation.Config())
+    hidden = {simulation.PARAMETER_LABELS[name] for name in simulation.HEADLESS_PARAMETERS}
+    shown = [key for key in input_fields if key not in hidden]
 
     value_fields = {}
     active_field = None
+    page = 0
 
     action_buttons_width = 300
     action_buttons_height = 50
     start_button = pygame.Rect(WIDTH // 2 - action_buttons_width // 2, HEIGHT - 155, action_buttons_width, action_buttons_height)
     exit_button = pygame.Rect(WIDTH // 2 - action_buttons_width // 2, HEIGHT - 99, action_buttons_width, action_buttons_height)
+    previous_button = pygame.Rect(WIDTH // 2 - 150, start_button.y - 42, 40, 32)
+    next_button = pygame.Rect(WIDTH // 2 + 110, start_button.y - 42, 40, 32)
+
+    y_start = 80
+    per_page = (previous_button.y - 8 - y_start) // ROW_HEIGHT
+    pages = [shown[i : i + per_page] for i in range(0, len(shown), per_page)]
+    max_label_width = max(render_text(key, 30).get_width() for key in shown) + 20
 
     while True:
         for event in pygame.event.get():
@@ -245,12 +254,18 @@ def draw_start_screen(window):
                         active_field = key
                         break
 
-                if start_button.collidepoint(event.pos):
+                if previous_button.collidepoint(event.pos) and page > 0: page -= 1
+                elif next_button.collidepoint(event.pos) and page < len(pages) - 1: page += 1
+                elif start_button.collidepoint(event.pos):
                     return {key: value for key, value in input_fields.items()}
                 elif exit_button.collidepoint(event.pos):
                     pygame.quit()
                     sys.exit()
 
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                page = min(max(page + (1 if event.key == pygame.K_PAGEDOWN else -1), 0), len(pages) - 1)
+                active_field = None
+
             elif event.type == pygame.KEYDOWN and active_field is not None:
                 if event.key == pygame.K_BACKSPACE:
                     input_fields[active_field] = input_fields[active_field][:-1]
@@ -260,40 +275,42 @@ def draw_start_screen(window):
                     input_fields[active_field] += event.unicode
 
         window.fill(WHITE)
-        title = big_font.render(WINDOW_TITLE, True, BLACK)
+        title = render_text(WINDOW_TITLE, 60)
         window.blit(title, (WIDTH // 2 - title.get_width() // 2, 20))
 
-        y_offset = 80
+        y_offset = y_start
         value_fields.clear()
 
-        max_label_width = 0
-        for key, value in input_fields.items():
-            label = font.render(key, True, BLACK)
-            max_label_width = max(max_label_width, label.get_width())
-
-        max_label_width += 20
-
-        for key, value in input_fields.items():
-            label = font.render(key, True, BLACK)
+        for key in pages[page]:
+            value = input_fields[key]
+            label = render_text(key, 30)
             window.blit(label, (WIDTH // 2 - max_label_width, y_offset))
 
-            field = pygame.Rect(WIDTH // 2, y_offset, max_label_width, 30)
+            field = pygame.Rect(WIDTH // 2, y_offset, max_label_width, ROW_HEIGHT - 2)
             value_fields[key] = field
             pygame.draw.rect(window, LIGHT_GRAY, field, 0)
             pygame.draw.rect(window, BLACK, field, 2)
 
             show_cursor = key == active_field and (pygame.time.get_ticks() // 500) % 2 == 0
             display_text = value + ('|' if show_cursor else '')
-            text = font.render(display_text, True, BLACK)
+            text = render_text(display_text, 30)
             window.blit(text, (field.x + 5, field.y + 5))
 
-            y_offset += 32
+            y_offset += ROW_HEIGHT
+
+        if len(pages) > 1:
+            for button, text in ((previous_button, "<"), (next_button, ">")):
+                pygame.draw.rect(window, LIGHT_GRAY if button is previous_button and page == 0 or button is next_button and page == len(pages) - 1 else BLACK, button)
+                arrow = render_text(text, 30, WHITE)
+                window.blit(arrow, arrow.get_rect(center=button.center))
+            page_text = render_text(f"Page {page + 1} of {len(pages)}", 30)
+            window.blit(page_text, page_text.get_rect(center=(WIDTH // 2, previous_button.centery)))
 
         pygame.draw.rect(window, BLACK, start_button)
         pygame.draw.rect(window, BLACK, exit_button)
 
-        start_text = font.render("Start Simulation", True, WHITE)
-        exit_text = font.render("Exit", True, WHITE)
+        start_text = render_text("Start Simulation", 30, WHITE)
+        exit_text = render_text("Exit", 30, WHITE)
 
         window.blit(start_text, (start_button.x + (action_buttons_width - start_text.get_width()) // 2, 
             start_button.y + (action_buttons_height - start_text.get_height()) // 2))
@@ -303,66 +320,23 @@ def draw_start_screen(window):
         pygame.display.flip()
 
 
-def set_params(params):
-    global FPS, NUM_AGENTS, MAX_DAYS
-    global NO_MOVE_PROBABILITY, MAX_SPEED, VACCINED_PERCENTAGE, MASKED_PERCENTAGE
-    global FEARFUL_PERCENTAGE, ANTI_VACCINE_PERCENTAGE, MIN_DAYS_TO_LIVE
-    global NORMAL_DEATH_PROBABILITY, REPRODUCTION_PROBABILITY, REPRODUCTION_RADIUS
-    global INFECTION_RADIUS, INFECTION_PROBABILITY, INFECTED_ON_START
-    global MIN_INFECTED_DAYS, CURE_PROBABILITY, IMMUNITY_DAYS, DISEASE_DEATH_PROBABILITY
-    global GATHER_STATS, DAY_IN_WEEK_MODIFIER, SHOW_VIEW
-
-    FPS = int(params["FPS"])
-    NUM_AGENTS = int(params["Agents count"])
-    MAX_DAYS = int(params["Maximum simulation duration in days"])
-    GATHER_STATS = params["Gather stats data"].lower() == "true"
-    SHOW_VIEW = params["Show simulation view"].lower() == "true"
-    
-    NO_MOVE_PROBABILITY = float(params["Probability of agent staying in one place"])
-    MAX_SPEED = int(params["Maximum distance per day"])
-    VACCINED_PERCENTAGE = float(params["Percentage of population vaccined every day"])
-    MASKED_PERCENTAGE = float(params["Percentage of population masked every day"])
-    FEARFUL_PERCENTAGE = float(params["Percentage of population being fearful"])
-    ANTI_VACCINE_PERCENTAGE = float(params["Percentage of population being anti vaccine"])
-    MIN_DAYS_TO_LIVE = int(params["Minimum normal life duration"])
-    NORMAL_DEATH_PROBABILITY = float(params["Probability of natural death"])
-    REPRODUCTION_PROBABILITY = float(params["Probability of reproduction "])
-    REPRODUCTION_RADIUS = int(params["Reproduction radius"])
-    DAY_IN_WEEK_MODIFIER = [float(x) for x in params["Modifiers of maximum distance per day during week"].split(",")]
-    
-    INFECTION_RADIUS = int(params["Infection radius"])
-    INFECTION_PROBABILITY = float(params["Infection probability"])
-    INFECTED_ON_START = float(params["Percentage of population infected on start"])
-    MIN_INFECTED_DAYS = int(params["Minimum infection duration"])
-    CURE_PROBABILITY = float(params["Curing probability after minimum days"])
-    IMMUNITY_DAYS = int(params["Immunity duration after curied"])
-    DISEASE_DEATH_PROBABILITY = float(params["Probability of death due to infection"])
-
-
-def get_hovered_agent(agents):
-    mouse_x, mouse_y = pygame.mouse.get_pos()
-    for agent in agents:
-        dx = agent.x - mouse_x
-        dy = agent.y - mouse_y
-        if dx**2 + dy**2 <= DOT_SIZE**2:
-            return agent
-    return None
-
-
-def draw_tooltip(window, agent, set_coords: Union[tuple, None] = None, auto_position: bool = True):
+def get_hovered_agent(population, camera):
+    x, y = camera.to_world(*pygame.mouse.get_pos())
+    return population.find_at(x, y, DOT_SIZE / camera.zoom)
+
+
+def draw_tooltip(window, info_lines: list[str], set_coords: Union[tuple, None] = None, auto_position: bool = True):
     if set_coords is None:
         tooltip_x, tooltip_y = pygame.mouse.get_pos()
         x, y = tooltip_x + 10, tooltip_y + 10
     else:
         x, y = set_coords
 
-    font = pygame.font.SysFont(None, 20)
+    texts = [render_text(line, 20) for line in info_lines]
     padding = 5
     line_height = 20
 
-    info_lines = agent.get_info_list()
-
-    tooltip_width = max(font.size(line)[0] for line in info_lines) + 2 * padding
+    tooltip_width = max(text.get_width() for text in texts) + 2 * padding
     tooltip_height = line_height * len(info_lines) + 2 * padding
 
     if auto_position:
@@ -375,105 +349,166 @@ def draw_tooltip(window, agent, set_coords: Union[tuple, None] = None, auto_posi
     pygame.draw.rect(window, LIGHT_GRAY, tooltip_rect)
     pygame.draw.rect(window, BLACK, tooltip_rect, 2)
 
-    for i, line in enumerate(info_lines):
-        text = font.render(line, True, BLACK)
+    for i, text in enumerate(texts):
         window.blit(text, (x + 5, y + 5 + i * 20))
 
 
+# --- Simulation thread ---
+
+def simulate_day(config, population, day, stats, save_checkpoint, rule=None) -> int:
+    """Simulates the day and stores its stats and checkpoint, returns the next day.
+
+    With a StoppingRule that ends the run there, population.stopped is set.
+    """
+    population.step(day)
+    if config.gather_stats:
+        if population.profiler is None: stats.append(population.counters.row())
+        else:
+            with population.profiler.phase("gather_stats"): stats.append(population.counters.row())
+    day += 1
+    if population.profiler is not None: population.profiler.end_day(day) # drawing of the day is counted in the next row
+    save_checkpoint(population, day, stats)
+    if rule is not None: rule.check(population, day)
+    return day
+
+
+class SimulationThread(threading.Thread):
+    """Simulates days in the background while the window draws snapshots of the population.
+
+    frame is a recording.Frame replaced every config.render_every days, the window
+    reads only frames, so it never sees a population in the middle of a day.
+    """
+
+    def __init__(self, config, population, stats, save_checkpoint, rule=None):
+        super().__init__(daemon=True)
+        self.config = config
+        self.population = population
+        self.stats = stats
+        self.save_checkpoint = save_checkpoint
+        self.rule = rule
+        self.day = 0
+        self.frame = recording.snapshot(population, 0)
+        self.resumed = threading.Event() # cleared while paused
+        self.resumed.set()
+        self.stopped = False
+
+    def run(self):
+        render_every = max(1, self.config.render_every)
+        while self.day < self.config.max_days and self.population.stopped is None:
+            self.resumed.wait()
+            if self.stopped: return
+            self.day = simulate_day(self.config, self.population, self.day, self.stats, self.save_checkpoint, self.rule)
+            if self.day % render_every == 0 or self.day >= self.config.max_days or self.population.stopped is not None:
+                self.frame = recording.snapshot(self.population, self.day)
+
+    def pause(self, paused):
+        if paused: self.resumed.clear()
+        else: self.resumed.set()
+
+    def stop(self):
+        """Stops after the current day, the population can be used again when this returns."""
+        self.stopped = True
+        self.resumed.set()
+        self.join()
+
+
+
 # --- Main ---
 
-pygame.init()
-window = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption(WINDOW_TITLE)
-
-params = draw_start_screen(window)
-set_params(params)
-
-if GATHER_STATS:
-    stats_path = pathlib.Path("./stats")
-    if not stats_path.exists():
-        stats_path.mkdir(parents=True)
-
-agents = []
-for _ in range(0, NUM_AGENTS):
-    x = random.randint(0, WIDTH)
-    y = random.randint(0, HEIGHT)
-    agent = Agent(x, y, Status.Susceptible)
-    if random.random() < INFECTED_ON_START: agent.status = Status.Infected
-    if random.random() < ANTI_VACCINE_PERCENTAGE: agent.anti_vaccine = True
-    if random.random() < FEARFUL_PERCENTAGE: agent.fearful = True
-    agents.append(agent)
-
-clock = pygame.time.Clock()
-running = True
-day = 0
-stats = []
-start_max_speed = MAX_SPEED
-selected_agent = None
-paused = False
-
-if GATHER_STATS:    # 0th day
-    s = list(gather_stats(agents))
-    s.append(0)     # Vaccined
-    stats.append(s)
-
-while running:
-    day_in_week = day % 7
-    MAX_SPEED = start_max_speed * DAY_IN_WEEK_MODIFIER[day_in_week]
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False        
-        elif SHOW_VIEW and event.type == pygame.MOUSEBUTTONDOWN:
-            selected_agent = get_hovered_agent(agents)
-        elif SHOW_VIEW and event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-            paused = not paused
-
-    if SHOW_VIEW: window.fill(WHITE)
-
-    if SHOW_VIEW and paused:
-        for agent in agents:
-            agent.draw(window, selected=(agent == selected_agent))
-        
-        hovered_agent = get_hovered_agent(agents)
-        if hovered_agent:
-            draw_tooltip(window, hovered_agent)
-        
-    else:
+def main():
+    pygame.init()
+    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption(WINDOW_TITLE)
+
+    params = draw_start_screen(window)
+    config = simulation.resolve_seed(simulation.parse_params(params))
+
+    population = simulation.create_population(config)
+    save_checkpoint = checkpoint.checkpointer(checkpoint.CHECKPOINT_PATH, config.checkpoint_every)
+    if config.log_events: population.events = streaming.EventLog()
+    if config.profile: population.profiler = profiling.Profiler()
+
+    clock = pygame.time.Clock()
+    running = True
+    day = 0
+    stats = streaming.StatsWriter(simulation.STATS_PATH) if config.gather_stats else [] # rows go to disk as the run goes
+    selected_agent = None # Agent, or agent id for the vectorized engine and the simulation thread
+    camera = Camera(config.world_width, config.world_height)
+    minimap = None # rect of the minimap when drawn
+    paused = False
+    render_every = max(1, config.render_every)
+    rule = simulation.stopping_rule(config)
+
+    if config.gather_stats: stats.append(population.counters.row()) # 0th day
+
+    worker = None
+    if config.simulate_in_thread:
+        worker = SimulationThread(config, population, stats, save_checkpoint, rule)
+        worker.start()
+
+    while running:
+        view = population if worker is None else worker.frame
 
-        vaccined_today = [0]
-        for agent in agents:
-            agent.move()
-            result = agent.simulate_day(agents, vaccined_today)
-            if result == "DEAD":
-                agents.remove(agent)
-            elif result is not None: # reproduction happened
-                agents.append(result)
-                if (SHOW_VIEW): agent.draw(window, selected=(agent == selected_agent))
-                if (SHOW_VIEW): result.draw(window)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False        
+            elif config.show_view and camera.handle(event):
+                pass
+            elif config.show_view and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if minimap is not None and minimap.collidepoint(event.pos): camera.center_on(*minimap_to_world(minimap, camera, event.pos))
+                else: selected_agent = get_hovered_agent(view, camera)
+            elif config.show_view and event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                paused = not paused
+                if worker is not None: worker.pause(paused)
+
+        if worker is not None:
+            if not worker.is_alive(): running = False
+            draw = config.show_view
+        elif paused:
+            draw = config.show_view
+        else:
+            day = simulate_day(config, population, day, stats, save_checkpoint, rule)
+            if day >= config.max_days or population.stopped is not None: running = False
+            draw = config.show_view and (day % render_every == 0 or not running)
+
+        if draw:
+            view = population if worker is None else worker.frame
+            window.fill(WHITE)
+            if population.profiler is None: minimap = draw_view(window, view, camera, selected_agent)
             else:
-                if (SHOW_VIEW): agent.draw(window, selected=(agent == selected_agent))
+                with population.profiler.phase("render"): minimap = draw_view(window, view, camera, selected_agent)
 
-        s = list(gather_stats(agents))
-        s.append(vaccined_today[0])
-        if GATHER_STATS: stats.append(s)
-        
-        day += 1
-        if day >= MAX_DAYS: running = False
+            if paused:
+                hovered_agent = get_hovered_agent(view, camera)
+                if hovered_agent is not None:
+                    draw_tooltip(window, view.get_info_list(hovered_agent))
 
-    if (SHOW_VIEW):
-        pygame.display.flip()
-        clock.tick(FPS)
+            pygame.display.flip()
+
+        if draw or worker is not None: clock.tick(config.fps)
+
+    if worker is not None:
+        worker.stop()
+        day = worker.day
+
+    pygame.quit()
+
+    if population.stopped is not None:
+        stopped_day, reason = population.stopped
+        print(f"Stopped on day {stopped_day} ({reason}).")
+        day = simulation.fast_forward(config, population, rule, day, stats)
+    elif config.checkpoint_every > 0 and day < config.max_days: # window closed early, keep the state to resume from
+        checkpoint.save_checkpoint(checkpoint.checkpoint_path(checkpoint.CHECKPOINT_PATH, day), population, day, stats)
 
-pygame.quit()
+    if config.gather_stats: stats.close()
+    if population.events is not None: population.events.close()
+    if population.profiler is not None:
+        population.profiler.close()
+        print(population.profiler.summary())
 
-if GATHER_STATS:
-    with open('./stats/total-counts.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Day', 'Susceptible', 'Infected', 'Recovered', 'Vaccined'])
-        for i, stat in enumerate(stats):
-            writer.writerow([i] + list(stat))
+    print(f"Simulation finished succesfully (seed {config.seed}).")
 
-print("Simulation finished succesfully.")
 
-sys.exit()
+if __name__ == "__main__":
+    main()
+    sys.exit()
@@ -0,0 +1,355 @@
+import collections
+import concurrent.futures
+import csv
+import gzip
+import json
+import pathlib
+import selectors
+import socket
+import threading
+import time
+
+import numpy as np
+
+import simulation
+
+
+
+# --- Constants ---
+
+EVENTS_PATH = simulation.STATS_PATH.parent / "events.csv.gz"
+EVENT_COLUMNS = ['Day', 'Event', 'Agent', 'Other'] # Other is the infector of an infection and the parent of a birth
+FLUSH_EVERY = 7 # days of stats kept in memory before writing
+CHUNK_SIZE = 2 ** 16 # events kept in memory before writing
+PUBLISH_ADDRESS = "localhost:8765" # of live stats, "unix:<path>" for a Unix socket
+RING_SIZE = 4096 # days of live stats kept for subscribers
+MAX_BATCH = 64 # days sent to a subscriber at once, a subscriber further behind gets every nth day
+POLL_SECONDS = 0.05 # how often the publisher thread looks for new days
+
+
+
+# --- Helpers ---
+
+def open_text(path):
+    """Text file for writing, gzip compressed when the name ends with .gz."""
+    path = pathlib.Path(path)
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+    if path.suffix == ".gz": return gzip.open(path, mode='wt', newline='')
+    return open(path, mode='w', newline='')
+
+
+def import_pyarrow(path):
+    """pyarrow is optional, only Parquet files need it."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(f"Writing {path} needs pyarrow, install it or use a .csv file") from None
+    return pyarrow
+
+
+def parse_address(address):
+    """Socket family and address from "host:port", "port" or "unix:<path>"."""
+    if address.startswith("unix:"): return socket.AF_UNIX, address.removeprefix("unix:")
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "localhost", int(port))
+
+
+def read_stats(path):
+    """Rows without the Day column of a finished stats file, CSV or Parquet."""
+    path = pathlib.Path(path)
+    if path.suffix == ".parquet":
+        table = import_pyarrow(path).parquet.read_table(path)
+        return [list(row[1:]) for row in zip(*(table.column(name).to_pylist() for name in table.column_names))]
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        next(reader)
+        return [[int(x) for x in row[1:]] for row in reader]
+
+
+def parquet_writer(path, schema):
+    path = pathlib.Path(path)
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+    return import_pyarrow(path).parquet.ParquetWriter(path, schema)
+
+
+
+# --- Stats ---
+
+class StatsWriter:
+    """Daily stats rows written to CSV or Parquet in small batches as the run goes.
+
+    Can be passed to run_simulation in place of the stats list: it takes append(),
+    and iterating reads back the rows written so far (used by checkpoints). A Parquet
+    file cannot be read before it is closed, so its rows are also kept in memory.
+    """
+
+    def __init__(self, path, rows=(), flush_every=FLUSH_EVERY):
+        self.path = pathlib.Path(path)
+        self.flush_every = flush_every
+        self.buffer = []
+        self.count = 0
+
+        if self.path.suffix == ".parquet":
+            pyarrow = import_pyarrow(self.path)
+            self.schema = pyarrow.schema([(name, pyarrow.int64()) for name in simulation.STATS_COLUMNS])
+            self.parquet = parquet_writer(self.path, self.schema)
+            self.file = None
+            self.written = [] # rows without the Day column
+        else:
+            self.parquet = None
+            self.file = open_text(self.path)
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(simulation.STATS_COLUMNS)
+
+        for row in rows: self.append(row)
+
+    def append(self, row):
+        self.buffer.append([self.count] + list(row))
+        self.count += 1
+        if len(self.buffer) >= self.flush_every: self.flush()
+
+    def flush(self):
+        if not self.buffer: return
+
+        if self.parquet is not None:
+            columns = list(zip(*self.buffer))
+            self.parquet.write_batch(self.batch(columns))
+            self.written.extend(row[1:] for row in self.buffer)
+        else:
+            self.writer.writerows(self.buffer)
+            self.file.flush()
+        self.buffer = []
+
+    def batch(self, columns):
+        pyarrow = import_pyarrow(self.path)
+        return pyarrow.record_batch([pyarrow.array(column, pyarrow.int64()) for column in columns], schema=self.schema)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Rows without the Day column, like in the stats list."""
+        self.flush()
+        if self.parquet is not None: return iter([list(row) for row in self.written])
+        return iter(read_stats(self.path))
+
+    def close(self):
+        self.flush()
+        if self.parquet is not None: self.parquet.close()
+        else: self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+
+# --- Events ---
+
+class EventLog:
+    """Agent events (simulation.Event) buffered in memory and written in chunks by a background thread.
+
+    Populations set day at the start of every day and call record() for single events
+    or record_many() with arrays of agent ids.
+    """
+
+    def __init__(self, path=EVENTS_PATH, chunk_size=CHUNK_SIZE):
+        self.path = pathlib.Path(path)
+        self.chunk_size = chunk_size
+        self.day = 0
+        self.pending = 0
+        self.single = ([], [], [], [])  # day, event, agent, other of single events
+        self.batches = []               # (day, event, agent ids, other ids) of batched events
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.writing = None
+        self.open()
+
+    def open(self):
+        if self.path.suffix == ".parquet":
+            pyarrow = import_pyarrow(self.path)
+            self.schema = pyarrow.schema([
+                ('Day', pyarrow.int32()), ('Event', pyarrow.string()), ('Agent', pyarrow.int64()), ('Other', pyarrow.int64())
+            ])
+            self.parquet = parquet_writer(self.path, self.schema)
+        else:
+            self.parquet = None
+            self.file = open_text(self.path)
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(EVENT_COLUMNS)
+
+    def record(self, event, agent_id, other_id=-1):
+        days, events, agents, others = self.single
+        days.append(self.day)
+        events.append(event)
+        agents.append(agent_id)
+        others.append(other_id)
+        self.pending += 1
+        if self.pending >= self.chunk_size: self.flush()
+
+    def record_many(self, event, agent_ids, other_ids=None):
+        if len(agent_ids) == 0: return
+        if other_ids is None: other_ids = np.full(len(agent_ids), -1, dtype=np.int64)
+        self.batches.append((self.day, event, np.asarray(agent_ids), np.asarray(other_ids)))
+        self.pending += len(agent_ids)
+        if self.pending >= self.chunk_size: self.flush()
+
+    def flush(self):
+        """Hands buffered events to the writer thread, waits only if the previous chunk is still being written."""
+        if self.pending == 0: return
+
+        days, events, agents, others = self.single
+        chunk = [(np.array(days, dtype=np.int32), np.array(events, dtype=np.int8), np.array(agents, dtype=np.int64), np.array(others, dtype=np.int64))]
+        for day, event, agent_ids, other_ids in self.batches:
+            chunk.append((np.full(len(agent_ids), day, dtype=np.int32), np.full(len(agent_ids), event, dtype=np.int8), agent_ids, other_ids))
+        chunk = [np.concatenate(column) for column in zip(*chunk)]
+
+        self.single = ([], [], [], [])
+        self.batches = []
+        self.pending = 0
+
+        if self.writing is not None: self.writing.result()
+        self.writing = self.executor.submit(self.write_chunk, *chunk)
+
+    def write_chunk(self, days, events, agents, others):
+        # Keep the order of days, single and batched events of one day are interleaved otherwise
+        order = np.argsort(days, kind="stable")
+        days, events, agents, others = days[order], events[order], agents[order], others[order]
+        names = np.array([""] + [event.name for event in simulation.Event])[events]
+
+        if self.parquet is not None:
+            pyarrow = import_pyarrow(self.path)
+            self.parquet.write_batch(pyarrow.record_batch(
+                [pyarrow.array(days), pyarrow.array(names), pyarrow.array(agents), pyarrow.array(others)], schema=self.schema
+            ))
+        else:
+            self.writer.writerows(zip(days.tolist(), names.tolist(), agents.tolist(), others.tolist()))
+            self.file.flush()
+
+    def close(self):
+        self.flush()
+        if self.writing is not None: self.writing.result()
+        if self.parquet is not None: self.parquet.close()
+        else: self.file.close()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+
+# --- Live stats ---
+
+class Subscriber:
+    """Connection of one subscriber of StatsPublisher and what it still has to get."""
+
+    def __init__(self, connection, next_seq):
+        self.connection = connection
+        self.next_seq = next_seq # of the first day not sent yet
+        self.pending = b""
+
+
+class StatsPublisher:
+    """Sends stats of every day as JSON lines to local subscribers, usable as on_day callback.
+
+    The day loop only appends to a ring buffer of the last ring_size days, a background
+    thread does all socket work. A subscriber that reads slower than days come gets at most
+    MAX_BATCH days at once, evenly picked from the ones it missed, and the latest day always.
+    A new subscriber starts from the latest day.
+    """
+
+    def __init__(self, address=PUBLISH_ADDRESS, ring_size=RING_SIZE):
+        family, self.address = parse_address(address)
+        if family == socket.AF_UNIX: pathlib.Path(self.address).unlink(missing_ok=True)
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET: self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address)
+        self.server.listen()
+        self.server.setblocking(False)
+
+        self.ring = collections.deque(maxlen=ring_size) # (seq, JSON line)
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.last_time = time.perf_counter()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def __call__(self, population, day, stats=None):
+        self.publish(day, population.counters.row())
+
+    def publish(self, day, row):
+        now = time.perf_counter()
+        message = {"Day": day, **dict(zip(simulation.STATS_COLUMNS[1:], row)), "Seconds": now - self.last_time}
+        self.last_time = now
+        line = (json.dumps(message) + "\n").encode()
+        with self.lock:
+            self.ring.append((self.seq, line))
+            self.seq += 1
+
+    def pick(self, subscriber):
+        """Lines of days the subscriber did not get yet, downsampled to MAX_BATCH."""
+        with self.lock:
+            lines = [(seq, line) for seq, line in self.ring if seq >= subscriber.next_seq]
+        if len(lines) > MAX_BATCH:
+            step = -(-len(lines) // MAX_BATCH)
+            lines = lines[-1::-step][::-1]
+        if lines: subscriber.next_seq = lines[-1][0] + 1
+        return b"".join(line for _, line in lines)
+
+    def serve(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.server, selectors.EVENT_READ)
+        subscribers = {}
+
+        while self.running:
+            for key, _ in selector.select(timeout=POLL_SECONDS):
+                if key.fileobj is self.server:
+                    connection, _ = self.server.accept()
+                    connection.setblocking(False)
+                    with self.lock: start = self.ring[-1][0] if self.ring else self.seq
+                    subscribers[connection] = Subscriber(connection, start)
+                    selector.register(connection, selectors.EVENT_READ)
+                else:
+                    self.drop(selector, subscribers, key.fileobj) # subscribers do not send, readable means closed
+
+            for subscriber in list(subscribers.values()):
+                if not subscriber.pending: subscriber.pending = self.pick(subscriber)
+                if not subscriber.pending: continue
+                try:
+                    sent = subscriber.connection.send(subscriber.pending)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    self.drop(selector, subscribers, subscriber.connection)
+                    continue
+                subscriber.pending = subscriber.pending[sent:]
+
+        for connection in subscribers: connection.close()
+        selector.close()
+
+    def drop(self, selector, subscribers, connection):
+        selector.unregister(connection)
+        del subscribers[connection]
+        connection.close()
+
+    def close(self):
+        """Stops after sending what subscribers can take right now."""
+        time.sleep(POLL_SECONDS * 2)
+        self.running = False
+        self.thread.join()
+        self.server.close()
+        if isinstance(self.address, str): pathlib.Path(self.address).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
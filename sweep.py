@@ -0,0 +1,163 @@
+import argparse
+import concurrent.futures
+import csv
+import dataclasses
+import itertools
+import os
+import pathlib
+import sys
+
+import numpy as np
+
+import headless
+import results
+import rng
+import simulation
+
+
+
+# --- Constants ---
+
+SWEEP_PATH = simulation.STATS_PATH.parent / "sweep"
+COUNT_COLUMNS = simulation.STATS_COLUMNS[1:]
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+
+# --- Sweep ---
+
+def parse_grid(specs):
+    """Swept values keyed by Config field name, from specs like "infection_probability=0.05,0.1"."""
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip().lower().replace("-", "_")
+        if name not in simulation.PARAMETER_LABELS: raise ValueError(f"Unknown parameter: {name}")
+        grid[name] = [value.strip() for value in values.split(",")]
+    return grid
+
+
+def expand_grid(grid):
+    """Every combination of swept values, as a list of {name: value} points."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def extend(run, days):
+    """Rows of a run stopped early, continued with its last counts and no daily changes."""
+    last = list(run[-1][:len(simulation.Status)]) + [0] * (len(COUNT_COLUMNS) - len(simulation.Status))
+    return list(run) + [last] * (days - len(run))
+
+
+def summarize(runs):
+    """Per day mean and QUANTILES of every count column across replicates."""
+    days = max(len(run) for run in runs)
+    counts = np.array([extend(run, days) for run in runs], dtype=np.float64) # replicate x day x column
+    mean = counts.mean(axis=0)
+    quantiles = np.quantile(counts, QUANTILES, axis=0) # quantile x day x column
+
+    header = ['Day']
+    for column in COUNT_COLUMNS:
+        header.append(f"{column}_mean")
+        header.extend(f"{column}_q{round(q * 100):02d}" for q in QUANTILES)
+
+    rows = []
+    for day in range(counts.shape[1]):
+        row = [day]
+        for c in range(len(COUNT_COLUMNS)):
+            row.append(mean[day, c])
+            row.extend(quantiles[:, day, c])
+        rows.append(row)
+    return header, rows
+
+
+def write_rows(path, header, rows):
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def run_sweep(configs, replicates, output_dir, workers=None, store=None, reuse=True):
+    """Runs every config replicates times in a process pool, writes replicate and summary stats.
+
+    Replicate n runs with seed config.seed + n, so every point sees the same random streams.
+    Layout of output_dir: <point index>/replicate-<n>.csv with the usual total-counts.csv columns
+    and <point index>/summary.csv with the per day mean and quantiles across replicates.
+    With a results.ResultStore, new runs are added to it and, with reuse, stored runs are not simulated again.
+    """
+    runs = [[None] * replicates for _ in configs]
+    todo = {}
+    for point, config in enumerate(configs):
+        for replicate in range(replicates):
+            replicate_config = dataclasses.replace(config, seed=config.seed + replicate)
+            stored = store.get(replicate_config) if store is not None and reuse else None
+            if stored is None: todo[point, replicate] = replicate_config
+            else:
+                runs[point][replicate] = stored
+                simulation.write_stats(stored, output_dir / str(point) / f"replicate-{replicate}.csv")
+    print(f"{len(configs) * replicates - len(todo)} runs found in the results store, simulating {len(todo)}")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(simulation.run_simulation, config): key for key, config in todo.items()}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            point, replicate = futures[future]
+            runs[point][replicate] = future.result()
+            if store is not None: store.put(todo[point, replicate], runs[point][replicate])
+            simulation.write_stats(runs[point][replicate], output_dir / str(point) / f"replicate-{replicate}.csv")
+            print(f"\r{done}/{len(futures)} runs finished", end="", flush=True)
+    print()
+
+    for point, point_runs in enumerate(runs):
+        write_rows(output_dir / str(point) / "summary.csv", *summarize(point_runs))
+    return runs
+
+
+
+# --- Main ---
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Runs a grid of parameter values, every point many times, on all cores."
+    )
+    parser.add_argument("scenario", nargs="?", type=pathlib.Path, help="TOML or JSON scenario file with the base parameters")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...", help="swept parameter, can be repeated")
+    parser.add_argument("--replicates", type=int, default=10, help="runs of every grid point")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, help="seed of the first replicate, the scenario seed or a new one by default")
+    parser.add_argument("--output-dir", type=pathlib.Path, default=SWEEP_PATH)
+    parser.add_argument("--store", type=pathlib.Path, default=results.RESULTS_PATH, help="results store of finished runs")
+    parser.add_argument("--no-cache", action="store_true", help="simulate every run, stored ones are replaced")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    base = {} if args.scenario is None else headless.load_scenario(args.scenario)
+    grid = parse_grid(args.grid)
+    points = expand_grid(grid)
+
+    if args.seed is not None: base["seed"] = args.seed
+    elif base.get("seed") is None: base["seed"] = rng.new_seed()
+
+    defaults = simulation.get_params(simulation.Config())
+    configs = []
+    for point in points:
+        config = simulation.parse_params(headless.build_params(defaults, base, point))
+        config.gather_stats = True
+        config.show_view = False
+        configs.append(config)
+
+    with results.ResultStore(args.store) as store:
+        run_sweep(configs, args.replicates, args.output_dir, args.workers, store, reuse=not args.no_cache)
+
+    write_rows(
+        args.output_dir / "sweep.csv",
+        ['Point'] + list(grid),
+        [[index] + [point[name] for name in grid] for index, point in enumerate(points)]
+    )
+    print(f"Sweep of {len(points)} points x {args.replicates} replicates (first seed {base['seed']}) saved to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+import checkpoint
+import simulation
+
+
+def reference_checkpoint(tmp_path):
+    """Checkpoint of a reference run after deaths shuffled its agent pool."""
+    config = simulation.Config(
+        num_agents=400, max_days=40, seed=7, show_view=False, min_days_to_live=10, normal_death_probability=0.02
+    )
+    population = simulation.create_population(config)
+    stats = simulation.run_simulation(config, population)
+    ids = population.to_columns()["ids"]
+    assert not np.all(np.diff(ids) > 0) # swap-removes left the pool out of id order
+    path = tmp_path / "reference.npz"
+    checkpoint.save_checkpoint(path, population, config.max_days, stats)
+    return config, path
+
+
+def resumed_run(path, config):
+    population, day, stats = checkpoint.resume(path, config)
+    return population, simulation.run_simulation(config, population, day, stats)
+
+
+def test_vectorized_engine_sorts_reference_agents_by_id(tmp_path):
+    config, path = reference_checkpoint(tmp_path)
+    population, _, _ = checkpoint.resume(path, dataclasses.replace(config, use_vectorized_engine=True))
+    assert np.all(np.diff(population.ids) > 0)
+
+
+def test_event_calendar_keeps_events_of_resumed_reference_run(tmp_path):
+    config, path = reference_checkpoint(tmp_path)
+    calendar = dataclasses.replace(config, max_days=config.max_days + 150, use_vectorized_engine=True, use_event_calendar=True)
+    _, whole = resumed_run(path, calendar)
+    rows = np.array(whole[config.max_days + 1:])
+    for name in ("Deaths", "DiseaseDeaths", "Cures", "ImmunityLosses"):
+        assert rows[:, simulation.STATS_COLUMNS.index(name) - 1].sum() > 0, name
+
+    # The same agents handed over in id order give the same run
+    _, columns, day, stats = checkpoint.load_checkpoint(path)
+    order = np.argsort(columns["ids"])
+    columns = {name: value[order] if value.ndim else value for name, value in columns.items()}
+    population = simulation.create_population(calendar, columns)
+    assert simulation.run_simulation(calendar, population, day, stats) == whole
+
+    # Plans made from the reference agents carry over a second checkpoint unchanged
+    half = dataclasses.replace(calendar, max_days=config.max_days + 75)
+    population, stats = resumed_run(path, half)
+    checkpoint.save_checkpoint(tmp_path / "half.npz", population, half.max_days, stats)
+    _, split = resumed_run(tmp_path / "half.npz", calendar)
+    assert split == whole
+
+
+def test_neighbor_lists_rebuilt_on_resume_keep_the_run(tmp_path):
+    config = simulation.Config(num_agents=300, max_days=30, seed=7, show_view=False, use_neighbor_lists=True)
+    whole = simulation.run_simulation(config, simulation.create_population(config))
+
+    first = dataclasses.replace(config, max_days=11) # lists built on day 10 are reused after the checkpoint
+    population = simulation.create_population(first)
+    stats = simulation.run_simulation(first, population)
+    checkpoint.save_checkpoint(tmp_path / "lists.npz", population, first.max_days, stats)
+    population, day, stats = checkpoint.resume(tmp_path / "lists.npz", config)
+    assert simulation.run_simulation(config, population, day, stats) == whole
+
+
+@pytest.mark.parametrize("overrides", [
+    {},
+    {"use_vectorized_engine": True},
+    {"use_vectorized_engine": True, "use_event_calendar": True},
+    {"use_vectorized_engine": True, "mean_field_infection": True},
+    {"use_vectorized_engine": True, "workers": 2},
+    {"use_neighbor_lists": True},
+    {"single_draw_infection": True},
+])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, overrides):
+    config = simulation.Config(num_agents=300, max_days=30, seed=5, show_view=False, **overrides)
+    whole = simulation.run_simulation(config)
+
+    first = dataclasses.replace(config, max_days=12)
+    population = simulation.create_population(first)
+    stats = simulation.run_simulation(first, population)
+    checkpoint.save_checkpoint(tmp_path / "resume.npz", population, first.max_days, stats)
+    population, day, stats = checkpoint.resume(tmp_path / "resume.npz", config)
+    assert simulation.run_simulation(config, population, day, stats) == whole
@@ -0,0 +1,22 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+import simulation
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_runs_match_vectorized_engine(workers):
+    config = simulation.Config(
+        num_agents=600, max_days=25, seed=8, show_view=False, use_vectorized_engine=True, min_days_to_live=10, normal_death_probability=0.02
+    )
+    vectorized = simulation.create_population(config)
+    stats = simulation.run_simulation(config, vectorized)
+    parallel_config = dataclasses.replace(config, workers=workers)
+    parallel = simulation.create_population(parallel_config)
+    assert simulation.run_simulation(parallel_config, parallel) == stats
+
+    expected, columns = vectorized.to_columns(), parallel.to_columns()
+    for name in ("ids", *simulation.AGENT_COLUMNS):
+        assert np.array_equal(columns[name], expected[name]), name
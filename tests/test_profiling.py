@@ -0,0 +1,17 @@
+import pytest
+
+import profiling
+import simulation
+
+
+@pytest.mark.parametrize("overrides", [{}, {"use_vectorized_engine": True}, {"use_neighbor_lists": True}])
+def test_profiler_does_not_change_results(tmp_path, overrides):
+    config = simulation.Config(num_agents=300, max_days=20, seed=2, show_view=False, **overrides)
+    stats = simulation.run_simulation(config)
+
+    population = simulation.create_population(config)
+    with profiling.Profiler(tmp_path / "profile.csv") as profiler:
+        population.profiler = profiler
+        assert simulation.run_simulation(config, population) == stats
+    assert profiler.days == config.max_days
+
@@ -0,0 +1,28 @@
+import numpy as np
+
+import recording
+import simulation
+
+
+def test_recording_round_trips_through_seeks(tmp_path):
+    config = simulation.Config(num_agents=200, max_days=23, seed=4, show_view=False, use_vectorized_engine=True, min_days_to_live=5)
+    population = simulation.create_population(config)
+    recorder = recording.Recorder(tmp_path, config, keyframe_every=5)
+    recorder.record(population, 0)
+    frames = [recording.snapshot(population, 0)]
+
+    def on_day(population, day, stats):
+        recorder.record(population, day)
+        frames.append(recording.snapshot(population, day))
+
+    simulation.run_simulation(config, population, on_day=on_day)
+    recorder.close()
+
+    replay = recording.Recording(tmp_path)
+    for day in [23, 3, 17, 18, 4, 0, 12, 12, 22, 6]: # backwards, forwards, within and across segments
+        frame, expected = replay.frame(day), frames[day]
+        assert frame.day == day
+        assert np.array_equal(frame.ids, expected.ids)
+        assert np.array_equal(frame.status, expected.status)
+        assert np.allclose(frame.x, expected.x, atol=1 / recording.POSITION_SCALE)
+        assert np.allclose(frame.y, expected.y, atol=1 / recording.POSITION_SCALE)
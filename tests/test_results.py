@@ -0,0 +1,38 @@
+import dataclasses
+
+import headless
+import results
+import simulation
+
+
+def test_stored_run_is_found_by_parameters(tmp_path):
+    config = simulation.Config(num_agents=200, max_days=10, seed=4, show_view=False)
+    stats = simulation.run_simulation(config)
+    with results.ResultStore(tmp_path / "results.sqlite") as store:
+        store.put(config, stats)
+        assert store.get(dataclasses.replace(config, fps=5, profile=True)) == stats # output fields are not part of the key
+        assert store.get(dataclasses.replace(config, seed=5)) is None
+        assert [key for key, _ in store.query(seed=4)] == [results.config_key(config)]
+
+
+def test_headless_reuses_stored_run(tmp_path, capsys):
+    argv = ["--output-dir", str(tmp_path), "--store", str(tmp_path / "results.sqlite"), "--num-agents", "200", "--max-days", "10", "--seed", "3"]
+    headless.main(argv)
+    first = (tmp_path / "total-counts.csv").read_text()
+    capsys.readouterr()
+    headless.main(argv)
+    assert "reused" in capsys.readouterr().out
+    assert (tmp_path / "total-counts.csv").read_text() == first
+
+
+def test_runs_of_another_model_version_are_stale(tmp_path, monkeypatch):
+    config = simulation.Config(num_agents=200, max_days=10, seed=4, show_view=False)
+    stats = simulation.run_simulation(config)
+    with results.ResultStore(tmp_path / "results.sqlite") as store:
+        store.put(config, stats)
+        monkeypatch.setattr(simulation, "MODEL_VERSION", simulation.MODEL_VERSION + 1)
+        assert store.get(config) is None
+        assert store.query() == []
+        store.put(config, stats)
+        assert store.prune() == 1
+        assert store.get(config) == stats
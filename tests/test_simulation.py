@@ -0,0 +1,27 @@
+import simulation
+
+
+def vectorized_stats(**overrides):
+    config = simulation.Config(num_agents=400, max_days=20, seed=11, show_view=False, use_vectorized_engine=True, **overrides)
+    return simulation.run_simulation(config)
+
+
+def test_vectorized_results_do_not_depend_on_pair_chunk_size(monkeypatch):
+    stats = vectorized_stats()
+    monkeypatch.setattr(simulation, "PAIR_CHUNK_SIZE", 97)
+    assert vectorized_stats() == stats
+
+
+def test_neighbor_lists_never_miss_a_pair_in_range():
+    config = simulation.Config(num_agents=300, max_days=40, seed=5, show_view=False, use_neighbor_lists=True, max_speed=4)
+    population = simulation.create_population(config)
+    lists = population.neighbor_lists
+    for day in range(config.max_days):
+        population.step(day)
+        for radius in lists.radii:
+            for agent in population.agents:
+                near = lists.around(agent, radius)
+                assert [other.id for other in near] == sorted(other.id for other in near)
+                in_range = {other for other in population.agents if agent.distance_squared(other) < radius ** 2}
+                assert in_range <= set(near)
+    assert lists.rebuilds > 1
@@ -0,0 +1,48 @@
+import csv
+
+import pytest
+
+import checkpoint
+import headless
+import simulation
+import streaming
+
+
+def test_parquet_stats_are_readable_while_written(tmp_path):
+    pytest.importorskip("pyarrow")
+    rows = [[i, i + 1, i + 2] + [0] * (len(simulation.STATS_COLUMNS) - 4) for i in range(10)]
+    with streaming.StatsWriter(tmp_path / "stats.parquet", flush_every=3) as stats:
+        for row in rows: stats.append(row)
+        assert list(stats) == rows
+    assert streaming.read_stats(tmp_path / "stats.parquet") == rows
+
+
+def test_parquet_stats_with_checkpoints(tmp_path):
+    pytest.importorskip("pyarrow")
+    headless.main([
+        "--output-dir", str(tmp_path), "--checkpoint-dir", str(tmp_path / "checkpoints"), "--stats-format", "parquet",
+        "--store", str(tmp_path / "results.sqlite"), "--num-agents", "200", "--max-days", "10", "--checkpoint-every", "5", "--seed", "3"
+    ])
+    _, _, day, stats = checkpoint.load_checkpoint(tmp_path / "checkpoints" / "day-00010.npz")
+    assert day == 10
+    assert stats == streaming.read_stats(tmp_path / "total-counts.parquet")
+
+
+@pytest.mark.parametrize("overrides", [{}, {"use_vectorized_engine": True}, {"use_vectorized_engine": True, "use_event_calendar": True}])
+def test_event_log_counts_match_stats(tmp_path, overrides):
+    config = simulation.Config(
+        num_agents=300, max_days=40, seed=9, show_view=False, log_events=True, min_days_to_live=20, normal_death_probability=0.02, **overrides
+    )
+    population = simulation.create_population(config)
+    with streaming.EventLog(tmp_path / "events.csv") as events:
+        population.events = events
+        stats = simulation.run_simulation(config, population)
+
+    columns = {"Infection": "Infections", "Birth": "Births", "Death": "Deaths", "DiseaseDeath": "DiseaseDeaths", "Vaccination": "Vaccined", "Cure": "Cures"}
+    expected = {(day, event): row[simulation.STATS_COLUMNS.index(column) - 1] for day, row in enumerate(stats) for event, column in columns.items()}
+    logged = dict.fromkeys(expected, 0)
+    with open(tmp_path / "events.csv", newline="") as file:
+        for row in csv.DictReader(file):
+            logged[int(row["Day"]), row["Event"]] += 1
+    assert sum(logged.values()) > 0
+    assert logged == expected